@@ -1,10 +1,15 @@
 """
 Marketplace API endpoints using Django Ninja.
 """
+from datetime import timedelta
 from ninja import Router
 from typing import List, Optional
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from .models import Marketplace, Store, StorePriceSettings, StoreInventorySettings, PriceRange, PriceRangeMargin
+from products.models import Product
+from products.scheduler import schedule_stores
+from products.volatility import reference_rate
 from vendor.models import Vendor
 
 router = Router()
@@ -55,6 +60,8 @@ def get_store(request, store_id: int):
         },
         'scraping_enabled': store.scraping_enabled,
         'scraping_interval_hours': store.scraping_interval_hours,
+        'min_scraping_interval_hours': store.min_scraping_interval_hours,
+        'max_scraping_interval_hours': store.max_scraping_interval_hours,
         'price_update_enabled': store.price_update_enabled,
         'is_active': store.is_active,
         'price_settings': list(price_settings),
@@ -69,8 +76,18 @@ def create_store(request, marketplace_id: int, name: str):
 
 @router.put("/stores/{store_id}")
 def update_store(request, store_id: int, name: str = None, 
-                scraping_enabled: bool = None, price_update_enabled: bool = None):
-    """Update a store."""
+                scraping_enabled: bool = None, price_update_enabled: bool = None,
+                scraping_interval_hours: int = None,
+                min_scraping_interval_hours: int = None, max_scraping_interval_hours: int = None):
+    """
+    Update a store. A new scraping interval reschedules its scraped products;
+    disabling scraping takes its products off the scrape schedule until it is
+    enabled again.
+
+    Setting min/max_scraping_interval_hours lets products be scraped more or
+    less often than scraping_interval_hours depending on how often their
+    price changes; pass 0 to clear a bound.
+    """
     store = get_object_or_404(Store, id=store_id)
     if name:
         store.name = name
@@ -78,7 +95,31 @@ def update_store(request, store_id: int, name: str = None,
         store.scraping_enabled = scraping_enabled
     if price_update_enabled is not None:
         store.price_update_enabled = price_update_enabled
+    interval_changed = (
+        scraping_interval_hours is not None and scraping_interval_hours != store.scraping_interval_hours
+    )
+    if interval_changed:
+        if scraping_interval_hours < 1:
+            return {'success': False, 'error': 'scraping_interval_hours must be at least 1'}
+        store.scraping_interval_hours = scraping_interval_hours
+    if min_scraping_interval_hours is not None:
+        store.min_scraping_interval_hours = min_scraping_interval_hours or None
+    if max_scraping_interval_hours is not None:
+        store.max_scraping_interval_hours = max_scraping_interval_hours or None
+    shortest = store.min_scraping_interval_hours or store.scraping_interval_hours
+    longest = store.max_scraping_interval_hours or store.scraping_interval_hours
+    if not shortest <= store.scraping_interval_hours <= longest:
+        return {
+            'success': False,
+            'error': 'Scraping interval bounds must satisfy min <= scraping_interval_hours <= max',
+        }
     store.save()
+    if interval_changed:
+        Product.objects.filter(store=store, last_scraped__isnull=False).update(
+            next_scrape_at=F('last_scraped') + timedelta(hours=scraping_interval_hours)
+        )
+        Store.objects.filter(pk=store.pk).update(price_change_reference_rate=reference_rate(store.id))
+    schedule_stores([store.id])
     return {'id': store.id, 'name': store.name, 'updated': True}
 
 @router.delete("/stores/{store_id}")
@@ -87,6 +128,7 @@ def delete_store(request, store_id: int):
     store = get_object_or_404(Store, id=store_id)
     store.is_active = False
     store.save()
+    schedule_stores([store.id])
     return {'success': True}
 
 # Store Price Settings endpoints
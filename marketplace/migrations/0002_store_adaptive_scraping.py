@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='max_scraping_interval_hours',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='min_scraping_interval_hours',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='price_change_reference_rate',
+            field=models.FloatField(blank=True, help_text="Typical price changes per hour of this store's products; set after each scrape", null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_store_adaptive_scraping'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='store',
+            name='price_change_reference_rate',
+            field=models.FloatField(blank=True, help_text="Typical price changes per hour of this store's products; refreshed by the periodic scrape maintenance", null=True),
+        ),
+    ]
@@ -41,6 +41,15 @@ class Store(models.Model):
     # Scraping configuration
     scraping_enabled = models.BooleanField(default=True)
     scraping_interval_hours = models.IntegerField(default=24)
+    # Bounds on the per-product intervals adapted from price volatility;
+    # unset, a bound is scraping_interval_hours itself
+    min_scraping_interval_hours = models.PositiveIntegerField(null=True, blank=True)
+    max_scraping_interval_hours = models.PositiveIntegerField(null=True, blank=True)
+    price_change_reference_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Typical price changes per hour of this store\'s products; refreshed by the periodic scrape maintenance'
+    )
     last_scrape_time = models.DateTimeField(null=True, blank=True)
     price_update_enabled = models.BooleanField(default=True)
     
@@ -4,14 +4,21 @@ Products API endpoints using Django Ninja.
 from ninja import Router, File
 from ninja.files import UploadedFile
 from typing import List, Optional
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
-from .models import Product, Upload, Scrape, ScrapeResult
+from .models import Product, Upload, UploadError, Scrape, ScrapeResult
+from .uploads import (
+    UploadInProgress, find_matching_upload, hash_upload_file, mark_upload_failed, process_resumed_upload,
+    process_upload, store_upload_file,
+)
+from .leases import launch_worker, queue_scrape
+from . import progress, volatility
 from marketplace.models import Store
 from vendor.models import Vendor
-import csv
-import io
 import uuid
 import os
 
@@ -49,7 +56,7 @@ def list_products(request, store_id: Optional[int] = None, vendor_id: Optional[i
         'offset': offset,
     }
 
-@router.get("/{product_id}")
+@router.get("/{int:product_id}")
 def get_product(request, product_id: int):
     """Get a specific product."""
     product = get_object_or_404(Product.objects.select_related('vendor', 'marketplace', 'store'), id=product_id)
@@ -76,6 +83,10 @@ def get_product(request, product_id: int):
         'vendor_stock': product.vendor_stock,
         'calculated_stock': product.calculated_stock,
         'last_scraped': product.last_scraped,
+        'next_scrape_at': product.next_scrape_at,
+        'price_changes_per_day': round(24 * volatility.change_rate(
+            product.price_changes_observed, product.price_hours_observed, product.store.scraping_interval_hours,
+        ), 4),
         'is_active': product.is_active,
     }
 
@@ -98,7 +109,7 @@ def create_product(request, vendor_id: int, store_id: int, vendor_sku: str,
     
     return {'id': product.id, 'vendor_sku': product.vendor_sku, 'title': product.title}
 
-@router.delete("/{product_id}")
+@router.delete("/{int:product_id}")
 def delete_product(request, product_id: int):
     """Delete (deactivate) a product."""
     product = get_object_or_404(Product, id=product_id)
@@ -108,78 +119,95 @@ def delete_product(request, product_id: int):
 
 # Upload endpoints
 @router.post("/upload")
-def upload_products(request, file: UploadedFile = File(...), vendor_id: int = None, store_id: int = None):
-    """Upload products from CSV file."""
+def upload_products(request, file: UploadedFile = File(...), vendor_id: int = None, store_id: int = None,
+                    workers: int = 1, idempotent: bool = False):
+    """
+    Upload products from a CSV or Excel (.xlsx) file.
+    
+    With workers > 1 the file is partitioned by vendor_sku and ingested by a
+    pool of worker processes, up to UPLOAD_MAX_WORKERS (1 unless enabled for
+    the deployment). With idempotent=true, re-submitting content
+    identical to an earlier (not failed) upload for the same vendor and store
+    returns that upload instead of processing the file again.
+    """
     vendor = get_object_or_404(Vendor, id=vendor_id)
     store = get_object_or_404(Store.objects.select_related('marketplace'), id=store_id)
     
+    content_hash = hash_upload_file(file)
+    if idempotent:
+        existing = find_matching_upload(vendor, store, content_hash)
+        if existing:
+            return {**upload_summary(existing), 'status': existing.status, 'duplicate': True}
+    
     # Create upload record
     upload = Upload.objects.create(
         vendor=vendor,
         store=store,
         filename=file.name,
-        status='processing',
+        content_hash=content_hash,
+        status='queued',
         started_at=timezone.now(),
+        workers=max(1, min(workers, settings.UPLOAD_MAX_WORKERS)),
     )
     
     try:
-        # Process CSV
-        content = file.read().decode('utf-8')
-        reader = csv.DictReader(io.StringIO(content))
-        
-        created_count = 0
-        error_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(reader, start=2):
-            try:
-                # Create product from CSV row
-                Product.objects.update_or_create(
-                    vendor=vendor,
-                    vendor_sku=row.get('vendor_sku', '').strip(),
-                    store=store,
-                    defaults={
-                        'marketplace': store.marketplace,
-                        'marketplace_child_sku': row.get('marketplace_child_sku', '').strip(),
-                        'marketplace_parent_sku': row.get('marketplace_parent_sku', '').strip(),
-                        'title': row.get('title', '').strip(),
-                        'source_url': row.get('source_url', '').strip(),
-                        'upload': upload,
-                    }
-                )
-                created_count += 1
-            except Exception as e:
-                error_count += 1
-                errors.append(f"Row {row_num}: {str(e)}")
-        
-        # Update upload status
-        upload.status = 'completed'
-        upload.total_rows = created_count + error_count
-        upload.successful_rows = created_count
-        upload.failed_rows = error_count
-        upload.error_details = {'errors': errors} if errors else {}
-        upload.completed_at = timezone.now()
-        upload.save()
-        
+        # Keep the file on disk so an interrupted upload can be resumed
+        store_upload_file(upload, file)
+        process_upload(upload)
     except Exception as e:
-        upload.status = 'failed'
-        upload.error_message = str(e)
-        upload.completed_at = timezone.now()
-        upload.save()
-        return {'success': False, 'error': str(e)}
+        mark_upload_failed(upload, e)
+        return {'success': False, 'upload_id': upload.id, 'error': str(e)}
+    
+    return upload_summary(upload)
+
+@router.post("/uploads/{upload_id}/resume")
+def resume_upload(request, upload_id: int):
+    """
+    Resume an interrupted upload from its last committed batch.
+    
+    Failed uploads can be resumed, and uploads left queued or processing
+    while no upload for the same vendor and store is running (their process
+    died).
+    """
+    upload = get_object_or_404(Upload.objects.select_related('vendor', 'store__marketplace'), id=upload_id)
     
+    try:
+        resumed = process_resumed_upload(upload)
+    except UploadInProgress as e:
+        return {'success': False, 'upload_id': upload.id, 'error': str(e)}
+    except Exception as e:
+        mark_upload_failed(upload, e)
+        return {'success': False, 'upload_id': upload.id, 'error': str(e)}
+    if not resumed:
+        upload.refresh_from_db()
+        return {'success': False, 'upload_id': upload.id, 'error': f"Upload cannot be resumed (status: {upload.status})"}
+    
+    return upload_summary(upload)
+
+def upload_summary(upload):
+    """Response body for a completed upload."""
     return {
         'success': True,
         'upload_id': upload.id,
-        'created': created_count,
-        'errors': error_count,
-        'error_details': errors[:10],  # Return first 10 errors
+        'created': upload.successful_rows,
+        'new': upload.new_rows,
+        'changed': upload.changed_rows,
+        'unchanged': upload.unchanged_rows,
+        'errors': upload.failed_rows,
+        'error_details': upload.error_details.get('errors', [])[:10],  # Return first 10 errors
     }
 
 # Scrape endpoints
 @router.post("/scrape")
 def start_scrape(request, store_id: int, vendor_id: Optional[int] = None):
-    """Start a scraping job for products."""
+    """
+    Start a scraping job for products.
+    
+    The scrape is queued in leases and runs in the background; poll
+    /scrapes/{scrape_id} for progress. With SCRAPE_USE_WORKERS the leases are
+    left to run_scrape_worker processes, otherwise a worker thread of this
+    process scrapes them.
+    """
     store = get_object_or_404(Store, id=store_id)
     
     # Create scrape record
@@ -189,16 +217,9 @@ def start_scrape(request, store_id: int, vendor_id: Optional[int] = None):
         status='pending',
     )
     
-    # Get products to scrape
-    query = Product.objects.filter(store=store, is_active=True)
-    if vendor_id:
-        query = query.filter(vendor_id=vendor_id)
-    
-    scrape.total_products = query.count()
-    scrape.save()
-    
-    # TODO: Trigger async scraping job here
-    # For now, just return the scrape ID
+    queue_scrape(scrape)
+    if not settings.SCRAPE_USE_WORKERS:
+        launch_worker()
     
     return {
         'scrape_id': scrape.id,
@@ -217,18 +238,43 @@ def get_scrape_status(request, scrape_id: int):
         'total_products': scrape.total_products,
         'successful_scrapes': scrape.successful_scrapes,
         'failed_scrapes': scrape.failed_scrapes,
+        'not_modified_scrapes': scrape.not_modified_scrapes,
+        'cache_hit_ratio': scrape.cache_hit_ratio,
+        'fanned_out_scrapes': scrape.fanned_out_scrapes,
+        'unchanged_scrapes': scrape.unchanged_scrapes,
+        'connections_opened': scrape.connections_opened,
+        'connections_reused': scrape.connections_reused,
+        'leases': dict(scrape.leases.values_list('status').annotate(count=Count('id')).order_by()),
+        'workers': list(scrape.leases.exclude(worker='').values_list('worker', flat=True).distinct()),
         'started_at': scrape.started_at,
         'completed_at': scrape.completed_at,
         'error_message': scrape.error_message,
     }
 
+@router.get("/scrapes/{scrape_id}/events")
+def stream_scrape_progress(request, scrape_id: int):
+    """Stream scrape progress as Server-Sent Events until the scrape finishes."""
+    scrape = get_object_or_404(Scrape, id=scrape_id)
+    
+    if isinstance(request, ASGIRequest):
+        events = progress.aevents(scrape.id)
+    else:
+        events = progress.events(scrape.id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Upload history endpoint
 @router.get("/uploads/")
 def list_uploads(request, page: int = 1, page_size: int = 10):
     """List uploads with pagination."""
     from django.core.paginator import Paginator
     
-    uploads_query = Upload.objects.select_related('vendor', 'store', 'store__marketplace').order_by('-created_at')
+    uploads_query = Upload.objects.select_related('vendor', 'store', 'store__marketplace').defer(
+        'error_details'
+    ).order_by('-created_at')
     
     paginator = Paginator(uploads_query, page_size)
     page_obj = paginator.get_page(page)
@@ -252,6 +298,10 @@ def list_uploads(request, page: int = 1, page_size: int = 10):
             'processed_rows': upload.processed_rows,
             'successful_rows': upload.successful_rows,
             'failed_rows': upload.failed_rows,
+            'new_rows': upload.new_rows,
+            'changed_rows': upload.changed_rows,
+            'unchanged_rows': upload.unchanged_rows,
+            'content_hash': upload.content_hash,
             'error_message': upload.error_message,
             'started_at': upload.started_at,
             'completed_at': upload.completed_at,
@@ -270,3 +320,33 @@ def list_uploads(request, page: int = 1, page_size: int = 10):
             'has_prev': page_obj.has_previous(),
         }
     }
+
+@router.get("/uploads/{upload_id}/errors")
+def list_upload_errors(request, upload_id: int, error_type: Optional[str] = None,
+                       page: int = 1, page_size: int = 100):
+    """List an upload's rejected rows with pagination, optionally filtered by error type."""
+    from django.core.paginator import Paginator
+    
+    upload = get_object_or_404(Upload.objects.only('id', 'error_details'), id=upload_id)
+    
+    errors_query = UploadError.objects.filter(upload=upload).order_by('row_number')
+    if error_type:
+        errors_query = errors_query.filter(error_type=error_type)
+    
+    paginator = Paginator(errors_query.values('row_number', 'error_type', 'message'), min(page_size, 1000))
+    page_obj = paginator.get_page(page)
+    
+    return {
+        'success': True,
+        'upload_id': upload.id,
+        'counts_by_type': upload.error_details.get('counts_by_type', {}),
+        'errors': list(page_obj),
+        'pagination': {
+            'current_page': page_obj.number,
+            'page_size': paginator.per_page,
+            'total_count': paginator.count,
+            'total_pages': paginator.num_pages,
+            'has_next': page_obj.has_next(),
+            'has_prev': page_obj.has_previous(),
+        }
+    }
@@ -0,0 +1,115 @@
+"""
+Content-addressed archive of fetched product pages.
+
+With SCRAPE_ARCHIVE_ENABLED, every page body a scrape fetches is kept
+gzip-compressed in default storage under SCRAPE_ARCHIVE_DIR, named by the
+SHA-256 of its content, and its ScrapeResults point to the ArchivedPage.
+An unchanged page fetched again by later scrapes (or for several products)
+is stored once; only its last_seen_at moves.
+
+This lets products.reparse re-run extraction over a past scrape without
+refetching anything. Retention is bounded by age, then by total size (see
+purge_archive), and enforced by the periodic scrape maintenance (see
+products.maintenance), or on demand by `manage.py purge_scrape_archive`.
+"""
+import datetime
+import gzip
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Sum
+from django.utils import timezone
+from .models import ArchivedPage
+
+
+def page_hash(body):
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def archive_path(content_hash):
+    return os.path.join(settings.SCRAPE_ARCHIVE_DIR, content_hash[:2], content_hash[2:4], f'{content_hash}.html.gz')
+
+
+def store_pages(pages):
+    """
+    Archive {content_hash: body}. Pages already in the archive are not
+    written again; their last_seen_at is refreshed.
+    """
+    if not pages:
+        return
+    now = timezone.now()
+    existing = set(ArchivedPage.objects.filter(pk__in=list(pages)).values_list('pk', flat=True))
+    if existing:
+        ArchivedPage.objects.filter(pk__in=existing).update(last_seen_at=now)
+
+    new_pages = []
+    for content_hash, body in pages.items():
+        if content_hash in existing:
+            continue
+        data = body.encode('utf-8')
+        compressed = gzip.compress(data, compresslevel=6)
+        path = archive_path(content_hash)
+        if not default_storage.exists(path):
+            saved = default_storage.save(path, ContentFile(compressed))
+            if saved != path:
+                # Another worker archived the same content meanwhile
+                default_storage.delete(saved)
+        new_pages.append(ArchivedPage(
+            content_hash=content_hash,
+            file_path=path,
+            size=len(data),
+            compressed_size=len(compressed),
+            last_seen_at=now,
+        ))
+    ArchivedPage.objects.bulk_create(new_pages, ignore_conflicts=True)
+
+
+def read_page(page):
+    """The body of an ArchivedPage."""
+    with default_storage.open(page.file_path, 'rb') as stream:
+        return gzip.decompress(stream.read()).decode('utf-8')
+
+
+def purge_archive(max_age_days=None, max_mb=None):
+    """
+    Delete pages not fetched for max_age_days, then the least recently
+    fetched ones until the archive is within max_mb. ScrapeResults of
+    deleted pages keep their data but lose the page.
+
+    Returns (pages deleted, compressed bytes freed).
+    """
+    max_age_days = settings.SCRAPE_ARCHIVE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_mb = settings.SCRAPE_ARCHIVE_MAX_MB if max_mb is None else max_mb
+
+    cutoff = timezone.now() - datetime.timedelta(days=max_age_days)
+    deleted, freed = delete_pages(ArchivedPage.objects.filter(last_seen_at__lt=cutoff))
+
+    excess = (ArchivedPage.objects.aggregate(total=Sum('compressed_size'))['total'] or 0) - max_mb * 1024 * 1024
+    if excess > 0:
+        oldest = ArchivedPage.objects.order_by('last_seen_at').values_list('pk', 'compressed_size')
+        doomed = []
+        for content_hash, compressed_size in oldest.iterator(chunk_size=5000):
+            doomed.append(content_hash)
+            excess -= compressed_size
+            if excess <= 0:
+                break
+        more_deleted, more_freed = delete_pages(ArchivedPage.objects.filter(pk__in=doomed))
+        deleted, freed = deleted + more_deleted, freed + more_freed
+    return deleted, freed
+
+
+def delete_pages(pages, batch_size=1000):
+    """Delete a queryset of ArchivedPages and their files; returns (pages, bytes)."""
+    deleted = freed = 0
+    while True:
+        batch = list(pages.values_list('pk', 'file_path', 'compressed_size')[:batch_size])
+        if not batch:
+            return deleted, freed
+        ArchivedPage.objects.filter(pk__in=[content_hash for content_hash, _, _ in batch]).delete()
+        for _, file_path, compressed_size in batch:
+            default_storage.delete(file_path)
+            freed += compressed_size
+        deleted += len(batch)
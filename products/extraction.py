@@ -0,0 +1,321 @@
+"""
+Price, stock and title extraction from vendor product pages.
+
+Each page goes through up to three stages, cheapest first:
+
+1. JSON-LD fast path: schema.org Product data in an application/ld+json
+   script is found with a regular expression over the raw HTML and decoded
+   with json, without building a DOM at all.
+2. lxml: the page is parsed with lxml.html and the vendor's ExtractionRule
+   selectors (or the generic itemprop / Open Graph rules) are evaluated.
+   Selectors are compiled once per scrape, not per page.
+3. BeautifulSoup: a lenient fallback for pages lxml cannot parse or where
+   the rules found no price.
+
+The stage that produced the result is reported as data['parser'].
+"""
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+from lxml.cssselect import CSSSelector
+from vendor.models import ExtractionRule
+from .models import Product
+
+
+class ExtractionError(Exception):
+    """No price could be extracted from a page, or a value does not fit its column."""
+
+
+# Digits with "." or "," marks, or groups of three after a space or an
+# apostrophe ("1 299,00", "1'299.00")
+PRICE_PATTERN = re.compile(r"\d+(?:[.,]\d+|[ \u00a0\u202f'\u2019]\d{3}(?!\d))*")
+
+GROUP_SEPARATORS = re.compile(r"[ \u00a0\u202f'\u2019]")
+
+STOCK_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+# Bounds of the Product.vendor_price and vendor_stock columns
+_price_field = Product._meta.get_field('vendor_price')
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+MAX_STOCK = 2 ** 31 - 1
+
+IN_STOCK = {'instock', 'limitedavailability', 'onlineonly', 'instoreonly', 'presale', 'preorder'}
+
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*?type\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# (field, selector_type, selector, attribute) tried, in order, for vendors
+# without rules of their own.
+DEFAULT_RULES = [
+    ('price', 'xpath', '//*[@itemprop="price"]', 'content'),
+    ('price', 'xpath', '//*[@itemprop="price"]', ''),
+    ('price', 'xpath', '//meta[@property="product:price:amount" or @property="og:price:amount"]', 'content'),
+    ('stock', 'xpath', '//*[@itemprop="inventoryLevel"]', 'content'),
+    ('availability', 'xpath', '//*[@itemprop="availability"]', 'content'),
+    ('availability', 'xpath', '//*[@itemprop="availability"]', 'href'),
+    ('availability', 'xpath', '//meta[@property="product:availability"]', 'content'),
+    ('title', 'xpath', '//meta[@property="og:title"]', 'content'),
+    ('title', 'xpath', '//title', ''),
+    ('title', 'xpath', '//h1', ''),
+]
+
+
+def compile_selector(selector_type, selector):
+    """
+    Compile an XPath or CSS selector into a callable taking an lxml tree.
+
+    Raises ValueError if the selector is not valid.
+    """
+    try:
+        if selector_type == 'css':
+            return CSSSelector(selector)
+        return etree.XPath(selector)
+    except Exception as e:
+        raise ValueError(f'Invalid {selector_type} selector {selector!r}: {e}') from e
+
+
+class PageExtractor:
+    """
+    Extracts product data from pages using one set of compiled rules.
+
+    rules is an iterable of (field, selector_type, selector, attribute);
+    rules for a field are tried in the order given.
+    """
+
+    def __init__(self, rules):
+        self.rules = {field: [] for field in ('price', 'stock', 'availability', 'title')}
+        for field, selector_type, selector, attribute in rules:
+            self.rules[field].append((compile_selector(selector_type, selector), attribute))
+
+    def extract(self, html):
+        """
+        Return {'price', 'stock', 'title', 'parser'} for a page.
+
+        stock is an exact quantity when the page gives one, 0 when it says
+        out of stock, and None when unknown. Raises ExtractionError if no
+        stage finds a price.
+        """
+        data = extract_json_ld(html)
+        if data is not None and data['price'] is not None:
+            return data
+
+        try:
+            data = self.extract_tree(lxml_html.document_fromstring(html))
+        except (etree.ParserError, ValueError):
+            data = None
+        if data is not None and data['price'] is not None:
+            return data
+
+        return extract_with_soup(html)
+
+    def extract_tree(self, tree):
+        return {
+            'price': parse_price(self.first_value(tree, 'price')),
+            'stock': parse_stock(self.first_value(tree, 'stock'), self.first_value(tree, 'availability')),
+            'title': self.first_value(tree, 'title') or '',
+            'parser': 'lxml',
+        }
+
+    def first_value(self, tree, field):
+        """The first non-empty value any of the field's rules selects, or None."""
+        for selector, attribute in self.rules[field]:
+            for match in selector(tree):
+                if isinstance(match, str):
+                    value = match
+                elif attribute:
+                    value = match.get(attribute) or ''
+                else:
+                    value = match.text_content()
+                value = value.strip()
+                if value:
+                    return value
+        return None
+
+
+DEFAULT_EXTRACTOR = PageExtractor(DEFAULT_RULES)
+
+
+def load_extraction_rules():
+    """{vendor_id: [(field, selector_type, selector, attribute)]} of every vendor's ExtractionRules."""
+    by_vendor = {}
+    for rule in ExtractionRule.objects.order_by('vendor_id', 'priority', 'id'):
+        by_vendor.setdefault(rule.vendor_id, []).append(
+            (rule.field, rule.selector_type, rule.selector, rule.attribute)
+        )
+    return by_vendor
+
+
+def build_extractors(rules_by_vendor):
+    """
+    {vendor_id: PageExtractor} for load_extraction_rules() output.
+
+    Vendors without rules use DEFAULT_EXTRACTOR. The vendor's rules are tried
+    before the generic ones.
+    """
+    return {
+        vendor_id: PageExtractor(rules + DEFAULT_RULES)
+        for vendor_id, rules in rules_by_vendor.items()
+    }
+
+
+def load_extractors():
+    """{vendor_id: PageExtractor} for every vendor with ExtractionRules."""
+    return build_extractors(load_extraction_rules())
+
+
+def extract_json_ld(html):
+    """Product data from the page's JSON-LD, or None if it has no Product block."""
+    product = find_json_ld_product(match.group(1) for match in JSON_LD_PATTERN.finditer(html))
+    if product is None:
+        return None
+    return product_from_json_ld(product, 'json-ld')
+
+
+def extract_with_soup(html):
+    """The BeautifulSoup fallback; raises ExtractionError if no price is found."""
+    soup = BeautifulSoup(html, 'lxml')
+    data = {'price': None, 'stock': None, 'title': '', 'parser': 'bs4'}
+
+    product = find_json_ld_product(
+        script.string or '' for script in soup.find_all('script', type='application/ld+json')
+    )
+    if product:
+        data = product_from_json_ld(product, 'bs4')
+
+    if data['price'] is None:
+        data['price'] = parse_price(
+            meta_content(soup, itemprop='price')
+            or meta_content(soup, property='product:price:amount')
+            or meta_content(soup, property='og:price:amount')
+        )
+    if data['stock'] is None:
+        data['stock'] = parse_stock(
+            meta_content(soup, itemprop='inventoryLevel'),
+            meta_content(soup, itemprop='availability')
+            or meta_content(soup, property='product:availability'),
+        )
+    if not data['title']:
+        data['title'] = (
+            meta_content(soup, property='og:title')
+            or (soup.title.string if soup.title and soup.title.string else '')
+        ).strip()
+
+    if data['price'] is None:
+        raise ExtractionError('No price found on page')
+    return data
+
+
+def find_json_ld_product(scripts):
+    """The first schema.org Product object in an iterable of JSON-LD script bodies, if any."""
+    for script in scripts:
+        try:
+            blocks = json.loads(script)
+        except ValueError:
+            continue
+        if isinstance(blocks, dict):
+            blocks = blocks.get('@graph', [blocks])
+        for block in blocks if isinstance(blocks, list) else []:
+            if not isinstance(block, dict):
+                continue
+            types = block.get('@type')
+            if types == 'Product' or isinstance(types, list) and 'Product' in types:
+                return block
+    return None
+
+
+def product_from_json_ld(product, parser):
+    offer = product.get('offers') or {}
+    if isinstance(offer, list):
+        offer = offer[0] if offer else {}
+    if not isinstance(offer, dict):
+        offer = {}
+    return {
+        'price': parse_price(offer.get('price') or offer.get('lowPrice')),
+        'stock': parse_stock(offer.get('inventoryLevel'), offer.get('availability')),
+        'title': str(product.get('name') or '').strip(),
+        'parser': parser,
+    }
+
+
+def meta_content(soup, **attrs):
+    """content (or text) of the first element matching attrs, or ''."""
+    element = soup.find(attrs=attrs)
+    if element is None:
+        return ''
+    return (element.get('content') or element.get_text()).strip()
+
+
+def parse_price(value):
+    """
+    Decimal price from a number or a string such as "$1,299.00" or
+    "1.299,00 €"; None if absent. Raises ExtractionError for a price too
+    large to store.
+    """
+    if value is None or value == '' or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        text = str(value)
+    else:
+        match = PRICE_PATTERN.search(str(value))
+        if not match:
+            return None
+        text = normalize_number(match.group())
+    try:
+        price = Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    if abs(price) >= MAX_PRICE:
+        raise ExtractionError(f'Price {value!r} is out of range')
+    return price
+
+
+def normalize_number(text):
+    """
+    Plain decimal text for a number written with thousands and decimal
+    marks: "1,299.00", "1.299,00" and "1 299,00" all give "1299.00".
+
+    With both "." and "," the last one is the decimal mark. A lone mark is
+    one too, unless it is followed by exactly three digits ("1,299",
+    "1.299"), which reads as a thousands group.
+    """
+    text = GROUP_SEPARATORS.sub('', text)
+    marks = [mark for mark in '.,' if mark in text]
+    if len(marks) == 2:
+        decimal_mark = max(marks, key=text.rfind)
+    elif marks and text.count(marks[0]) == 1:
+        integer, _, fraction = text.partition(marks[0])
+        decimal_mark = marks[0] if len(fraction) != 3 or integer == '0' else None
+    else:
+        decimal_mark = None
+
+    fraction = ''
+    if decimal_mark:
+        text, _, fraction = text.rpartition(decimal_mark)
+    integer = text.replace('.', '').replace(',', '')
+    return f'{integer}.{fraction}' if fraction else integer
+
+
+def parse_stock(quantity, availability):
+    """
+    Stock level from an explicit quantity, else 0 for an out-of-stock
+    availability. Raises ExtractionError for a quantity too large to store.
+    """
+    if isinstance(quantity, dict):
+        quantity = quantity.get('value')
+    if quantity not in (None, ''):
+        match = STOCK_PATTERN.search(str(quantity))
+        if match:
+            stock = int(float(match.group()))
+            if stock > MAX_STOCK:
+                raise ExtractionError(f'Stock {quantity!r} is out of range')
+            return stock
+    if availability:
+        state = str(availability).rsplit('/', 1)[-1].strip().lower().replace('_', '')
+        if state and state not in IN_STOCK:
+            return 0
+    return None
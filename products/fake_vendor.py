@@ -0,0 +1,160 @@
+"""
+A stand-in vendor site, for measuring scraping without the network.
+
+FakeVendor serves /products/<id> pages for any integer id, with configurable
+response latency, error rate, page size, cache validators, price churn and
+page template. `manage.py run_fake_vendor` runs one; bench_scrape starts
+one by itself unless given the URL of another.
+
+Every product page has a version, which each request bumps with probability
+change_rate; the version changes the page's price and its validators, so a
+conditional request gets a 304 only while the version stands.
+"""
+import asyncio
+import datetime
+import functools
+import json
+import random
+import string
+from email.utils import format_datetime
+
+from aiohttp import web
+
+
+TEMPLATES = ['json-ld', 'markup']
+
+# ETag behaviours: strong or weak ETags, Last-Modified only, no validators,
+# or ETags sent but never answered with a 304 (as behind some CDNs)
+ETAG_MODES = ['strong', 'weak', 'last-modified', 'none', 'ignore']
+
+
+class FakeVendor:
+    def __init__(
+        self, latency=0.05, jitter=0.5, error_rate=0.0, page_kb=80, change_rate=0.0,
+        etag='strong', template='json-ld',
+    ):
+        """
+        latency is the mean response delay in seconds, spread uniformly by
+        ±jitter of itself. error_rate is the share of requests answered
+        HTTP 503. template is one of TEMPLATES, or the path of an HTML file
+        with $id, $sku, $title, $price and $stock placeholders.
+        """
+        if etag not in ETAG_MODES:
+            raise ValueError(f'etag must be one of {", ".join(ETAG_MODES)}')
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.page_kb = page_kb
+        self.change_rate = change_rate
+        self.etag = etag
+        self.template = template
+        if template not in TEMPLATES:
+            with open(template, encoding='utf-8') as f:
+                self.custom_template = string.Template(f.read())
+        self.versions = {}
+        self.started = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/products/{product_id:\\d+}', self.product_page)
+        return app
+
+    async def product_page(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        if random.random() < self.error_rate:
+            return web.Response(status=503, text='Service Unavailable')
+
+        product_id = int(request.match_info['product_id'])
+        version = self.versions.get(product_id, 0)
+        if random.random() < self.change_rate:
+            version = self.versions[product_id] = version + 1
+
+        headers = self.validators(product_id, version)
+        if self.not_modified(request, headers):
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            text=self.render(product_id, version), content_type='text/html', headers=headers,
+        )
+
+    def validators(self, product_id, version):
+        tag = f'"{product_id}-{version}"'
+        if self.etag in ('strong', 'ignore'):
+            return {'ETag': tag}
+        if self.etag == 'weak':
+            return {'ETag': f'W/{tag}'}
+        if self.etag == 'last-modified':
+            # A page changes a second after the previous version
+            modified = self.started + datetime.timedelta(seconds=version)
+            return {'Last-Modified': format_datetime(modified, usegmt=True)}
+        return {}
+
+    def not_modified(self, request, headers):
+        if self.etag == 'ignore':
+            return False
+        if 'ETag' in headers:
+            return request.headers.get('If-None-Match') == headers['ETag']
+        if 'Last-Modified' in headers:
+            return request.headers.get('If-Modified-Since') == headers['Last-Modified']
+        return False
+
+    @functools.lru_cache(maxsize=4096)
+    def render(self, product_id, version):
+        if self.template in TEMPLATES:
+            return synthetic_page(product_id, self.page_kb, self.template == 'json-ld', version)
+        return self.custom_template.safe_substitute(
+            id=product_id,
+            sku=f'SKU-{product_id}',
+            title=f'Product {product_id}',
+            price=page_price(product_id, version),
+            stock=product_id % 37,
+        )
+
+
+def page_price(i, version=0):
+    return f'{10 + (i + version) % 500}.99'
+
+
+def synthetic_page(i, size_kb, json_ld, version=0):
+    """A product page with navigation, a description and related-product filler up to size_kb."""
+    price = page_price(i, version)
+    head = f'<title>Product {i} | Example Store</title><meta property="og:title" content="Product {i}">'
+    if json_ld:
+        head += '<script type="application/ld+json">' + json.dumps({
+            '@context': 'https://schema.org',
+            '@type': 'Product',
+            'name': f'Product {i}',
+            'sku': f'SKU-{i}',
+            'offers': {
+                '@type': 'Offer',
+                'price': price,
+                'priceCurrency': 'AUD',
+                'availability': 'https://schema.org/InStock',
+                'inventoryLevel': i % 37,
+            },
+        }) + '</script>'
+
+    nav = '<nav><ul>' + ''.join(f'<li><a href="/c/{n}">Category {n}</a></li>' for n in range(40)) + '</ul></nav>'
+    buy_box = (
+        f'<div class="buy-box" itemscope itemtype="https://schema.org/Product"><h2 itemprop="name">Product {i}</h2>'
+        f'<div itemprop="offers" itemscope itemtype="https://schema.org/Offer">'
+        f'<span class="amount" itemprop="price" content="{price}">${price}</span>'
+        f'<span class="qty" itemprop="inventoryLevel" content="{i % 37}">{i % 37} in stock</span>'
+        f'<link itemprop="availability" href="https://schema.org/InStock"></div></div>'
+    )
+    related = (
+        '<div class="related"><a href="/p/{n}"><img src="/img/{n}.jpg" alt="Related {n}">'
+        '<span class="name">Related product {n}</span><span class="price">$19.99</span></a></div>'
+    )
+    filler = []
+    length = len(head) + len(nav) + len(buy_box)
+    n = 0
+    while length < size_kb * 1024:
+        block = related.format(n=n)
+        filler.append(block)
+        length += len(block)
+        n += 1
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8">{head}</head><body>{nav}'
+        f'<main>{buy_box}<section>{"".join(filler)}</section></main></body></html>'
+    )
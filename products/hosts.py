@@ -0,0 +1,116 @@
+"""
+Retry backoff and circuit breaking per vendor host.
+
+A fetch that fails in a way worth retrying (a timeout, a connection error,
+HTTP 429 or 5xx) is retried up to SCRAPE_RETRY_ATTEMPTS times in all, each
+after a jittered exponential backoff (see retry_delay). The engine waits out
+the backoff without holding a worker, so other hosts keep being fetched.
+
+Each host has a HostCircuit over its last SCRAPE_BREAKER_WINDOW fetches.
+Once at least SCRAPE_BREAKER_MIN_REQUESTS of them have been made and
+SCRAPE_BREAKER_FAILURE_RATE of them failed, the circuit opens: the host's
+products fail at once, without a request, for SCRAPE_BREAKER_OPEN_SECONDS.
+Fetches to the host still in flight (mostly waiting for one of its pooled
+connections) are abandoned too, so the engine's workers are not left
+waiting out timeouts. Then one probe request is let through; if it succeeds
+the circuit closes, otherwise it stays open for another period.
+
+Only host failures count. A 404 or a page that does not parse says nothing
+about the host's health.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+def retry_delay(attempt):
+    """
+    Seconds to wait before retrying a fetch that failed on try number
+    attempt: a random wait between half and all of a cap that doubles from
+    SCRAPE_RETRY_BASE_SECONDS up to SCRAPE_RETRY_MAX_SECONDS, so retries of
+    many products spread out instead of hitting the host again together.
+    """
+    cap = min(settings.SCRAPE_RETRY_MAX_SECONDS, settings.SCRAPE_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(cap / 2, cap)
+
+
+class HostFailing(Exception):
+    """A host's circuit is open."""
+
+
+class HostCircuit:
+    """Closed, open or half-open (one probe in flight) state of one host."""
+
+    def __init__(self):
+        self.outcomes = deque(maxlen=settings.SCRAPE_BREAKER_WINDOW)
+        self.open_until = None
+        self.probing = False
+        self.last_error = ''
+        self.tripped = None
+
+    @property
+    def is_open(self):
+        return self.open_until is not None
+
+    def allow(self):
+        """Whether a request may be made to the host now."""
+        if self.open_until is None:
+            return True
+        if self.probing or time.monotonic() < self.open_until:
+            return False
+        self.probing = True
+        return True
+
+    async def guard(self, fetch):
+        """Await a fetch coroutine; raises HostFailing if the circuit opens meanwhile."""
+        if self.tripped is None or self.tripped.done():
+            self.tripped = asyncio.get_running_loop().create_future()
+        tripped = self.tripped
+        task = asyncio.ensure_future(fetch)
+        try:
+            await asyncio.wait([task, tripped], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not task.done():
+                task.cancel()
+        if not task.done() or task.cancelled():
+            raise HostFailing(self.last_error)
+        return task.result()
+
+    def record(self, ok, error='', probe=False):
+        """
+        Record the outcome of a request to the host. probe is whether it was
+        the request allow() let through while the circuit was open; only its
+        outcome closes the circuit or lets another probe through.
+        """
+        if self.open_until is not None:
+            if probe:
+                self.probing = False
+                if ok:
+                    self.outcomes.clear()
+                    self.open_until = None
+                else:
+                    self.trip(error)
+            elif not ok:
+                # A request started before the circuit opened
+                self.trip(error)
+            return
+
+        self.outcomes.append(ok)
+        if not ok:
+            self.last_error = error
+            failures = self.outcomes.count(False)
+            if (
+                len(self.outcomes) >= settings.SCRAPE_BREAKER_MIN_REQUESTS
+                and failures / len(self.outcomes) >= settings.SCRAPE_BREAKER_FAILURE_RATE
+            ):
+                self.trip(error)
+
+    def trip(self, error):
+        self.last_error = error
+        self.open_until = time.monotonic() + settings.SCRAPE_BREAKER_OPEN_SECONDS
+        if self.tripped is not None and not self.tripped.done():
+            self.tripped.set_result(None)
+
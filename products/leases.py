@@ -0,0 +1,265 @@
+"""
+Scraping one Scrape on many workers.
+
+queue_scrape() splits a Scrape's products into ScrapeLeases of
+SCRAPE_LEASE_SIZE consecutive product ids instead of scraping them in this
+process. Any number of `manage.py run_scrape_worker` processes, on any
+number of hosts, then claim leases with SELECT ... FOR UPDATE SKIP LOCKED,
+so no two workers ever hold the same lease and none waits on another.
+
+A worker renews its lease every third of SCRAPE_LEASE_SECONDS while it
+scrapes the batch. If it dies, the lease expires and another worker claims
+it, skipping products that already have a ScrapeResult for the Scrape or
+were scraped since it started (an unchanged product may have no result, see
+SCRAPE_SKIP_UNCHANGED_RESULTS), so a product is scraped again only if its
+outcome had not yet been flushed.
+
+A lease whose scrape raises is put back for another attempt. One that has
+been claimed SCRAPE_LEASE_MAX_ATTEMPTS times without finishing, whether its
+scrapes raised or its workers died, is failed together with its Scrape, so
+a batch that kills every worker taking it cannot keep the Scrape running
+forever.
+
+Every worker adds its outcomes to the same Scrape's counters (as increments,
+see ScrapeBatch.write), so the Scrape reports the run as a whole. The worker
+that finishes the last lease completes the Scrape.
+
+Without SCRAPE_USE_WORKERS, POST /products/scrape still queues leases, and
+runs a worker on a thread of the web process (see launch_worker). A lease
+left behind when that process stops, on a deploy or a restart, expires and
+is taken over by the next worker to run: the next scrape's, or
+`run_scrape_worker --once` run on a schedule.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .maintenance import maintain
+from .models import Scrape, ScrapeLease, ScrapeResult
+from .scraping import ScrapeEngine, ScrapeSource, complete_scrape, scrape_queryset
+
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(Exception):
+    """Another worker took over a lease after it expired."""
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def queue_scrape(scrape, lease_size=None):
+    """Split a pending Scrape into leases for scrape workers; returns the number of leases."""
+    lease_size = lease_size or settings.SCRAPE_LEASE_SIZE
+    ids = scrape_queryset(scrape).order_by('id').values_list('id', flat=True)
+    leases = []
+    total = 0
+    first_id = None
+    for total, product_id in enumerate(ids.iterator(chunk_size=10000), 1):
+        if first_id is None:
+            first_id = product_id
+        if total % lease_size == 0:
+            leases.append(ScrapeLease(scrape=scrape, first_product_id=first_id, last_product_id=product_id))
+            first_id = None
+    if first_id is not None:
+        leases.append(ScrapeLease(scrape=scrape, first_product_id=first_id, last_product_id=product_id))
+
+    with transaction.atomic():
+        ScrapeLease.objects.bulk_create(leases, batch_size=1000)
+        scrape.total_products = total
+        if not leases:
+            scrape.status = 'completed'
+            scrape.started_at = scrape.completed_at = timezone.now()
+        scrape.save(update_fields=['total_products', 'status', 'started_at', 'completed_at'])
+    return len(leases)
+
+
+def claim_lease(worker):
+    """
+    Lease the oldest pending or expired batch to worker, or return None if
+    there is none. Marks its Scrape running if this is the first claim.
+
+    Leases of Scrapes that have failed are passed over, and a lease out of
+    attempts is failed instead of claimed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        while True:
+            lease = (
+                ScrapeLease.objects.select_for_update(skip_locked=True)
+                .filter(Q(status='pending') | Q(status='leased', lease_expires_at__lt=now))
+                .filter(scrape_id__in=Scrape.objects.filter(status__in=['pending', 'running']).values('pk'))
+                .order_by('id')
+                .first()
+            )
+            if lease is None:
+                return None
+            if lease.attempts < settings.SCRAPE_LEASE_MAX_ATTEMPTS:
+                break
+            fail_lease(lease, lease.error_message or f'Lease expired {lease.attempts} times')
+        lease.status = 'leased'
+        lease.worker = worker
+        lease.lease_expires_at = now + datetime.timedelta(seconds=settings.SCRAPE_LEASE_SECONDS)
+        lease.attempts += 1
+        lease.save(update_fields=['status', 'worker', 'lease_expires_at', 'attempts', 'updated_at'])
+        Scrape.objects.filter(pk=lease.scrape_id, status='pending').update(status='running', started_at=now)
+    lease.scrape = Scrape.objects.get(pk=lease.scrape_id)
+    return lease
+
+
+def renew_lease(lease):
+    """Push the lease's expiry forward; raises LeaseLost if another worker has taken it."""
+    renewed = ScrapeLease.objects.filter(pk=lease.pk, status='leased', worker=lease.worker).update(
+        lease_expires_at=timezone.now() + datetime.timedelta(seconds=settings.SCRAPE_LEASE_SECONDS),
+        updated_at=timezone.now(),
+    )
+    if not renewed:
+        raise LeaseLost(f'Lease {lease.pk} was taken over by another worker')
+
+
+def release_lease(lease, error_message):
+    """
+    Give up a lease whose scrape raised: back to pending for another
+    attempt, or failed with its Scrape once it is out of attempts.
+    """
+    with transaction.atomic():
+        held = ScrapeLease.objects.select_for_update().filter(pk=lease.pk, status='leased', worker=lease.worker)
+        if not held.exists():
+            return
+        if lease.attempts >= settings.SCRAPE_LEASE_MAX_ATTEMPTS:
+            fail_lease(lease, error_message)
+        else:
+            held.update(status='pending', error_message=error_message, updated_at=timezone.now())
+
+
+def fail_lease(lease, error_message):
+    """Fail a lease, and its Scrape unless that has finished already."""
+    message = (
+        f'Products {lease.first_product_id}-{lease.last_product_id} failed '
+        f'after {lease.attempts} attempts: {error_message}'
+    )
+    now = timezone.now()
+    ScrapeLease.objects.filter(pk=lease.pk).update(status='failed', error_message=error_message, updated_at=now)
+    Scrape.objects.filter(pk=lease.scrape_id, status__in=['pending', 'running']).update(
+        status='failed', error_message=message, completed_at=now
+    )
+
+
+def finish_lease(lease):
+    """Mark the lease done, completing its Scrape if it was the last one outstanding."""
+    with transaction.atomic():
+        # Lock the Scrape so that of two workers finishing its last leases at
+        # once, the second sees the first's lease done.
+        scrape = Scrape.objects.select_for_update().get(pk=lease.scrape_id)
+        ScrapeLease.objects.filter(pk=lease.pk, worker=lease.worker).update(
+            status='done', updated_at=timezone.now()
+        )
+        if scrape.status == 'running' and not scrape.leases.exclude(status='done').exists():
+            complete_scrape(scrape)
+
+
+class LeaseSource(ScrapeSource):
+    """The products of one lease, less those a previous holder already recorded."""
+
+    def __init__(self, lease):
+        super().__init__(lease.scrape)
+        self.lease = lease
+
+    def queryset(self):
+        query = super().queryset().filter(
+            id__gte=self.lease.first_product_id, id__lte=self.lease.last_product_id
+        )
+        if self.lease.attempts > 1:
+            query = query.exclude(
+                id__in=ScrapeResult.objects.filter(scrape_id=self.lease.scrape_id).values('product_id')
+            ).exclude(last_scraped__gte=self.lease.scrape.started_at)
+        return query
+
+
+async def scrape_lease(lease, concurrency=None, engine_class=None):
+    """
+    Scrape a leased batch on a ScrapeEngine (or engine_class, such as
+    bench_scrape's instrumented one), renewing the lease until it is done.
+    """
+    async def keep_renewing():
+        while True:
+            await asyncio.sleep(settings.SCRAPE_LEASE_SECONDS / 3)
+            await sync_to_async(renew_lease)(lease)
+
+    renewer = asyncio.create_task(keep_renewing())
+    engine = asyncio.create_task(
+        (engine_class or ScrapeEngine)(LeaseSource(lease), concurrency=concurrency).run()
+    )
+    try:
+        await asyncio.wait([renewer, engine], return_when=asyncio.FIRST_COMPLETED)
+        if renewer.done():
+            engine.cancel()
+            await asyncio.gather(engine, return_exceptions=True)
+            renewer.result()
+        await engine
+    finally:
+        renewer.cancel()
+        engine.cancel()
+        await asyncio.gather(renewer, engine, return_exceptions=True)
+
+
+def run_worker(concurrency=None, once=False, stdout=None, engine_class=None):
+    """
+    Claim and scrape leases until there are none left (once) or forever,
+    polling every SCRAPE_WORKER_IDLE_SECONDS while there is no work. A lease
+    that raises is released (see release_lease) and the worker moves on.
+    Between leases it runs the periodic maintenance when due (see
+    products.maintenance).
+    """
+    worker = worker_name()
+    while True:
+        maintain()
+        lease = claim_lease(worker)
+        if lease is None:
+            if once:
+                return
+            time.sleep(settings.SCRAPE_WORKER_IDLE_SECONDS)
+            continue
+        try:
+            asyncio.run(scrape_lease(lease, concurrency, engine_class))
+            finish_lease(lease)
+        except LeaseLost:
+            continue
+        except Exception as e:
+            # Whatever broke this lease, keep serving the others
+            release_lease(lease, str(e) or e.__class__.__name__)
+            if stdout is not None:
+                stdout.write(f"{worker}: scrape {lease.scrape_id} lease {lease.pk} failed: {e!r}")
+            continue
+        if stdout is not None:
+            stdout.write(
+                f"{worker}: scrape {lease.scrape_id} products "
+                f"{lease.first_product_id}-{lease.last_product_id} done"
+            )
+
+
+def launch_worker(concurrency=None):
+    """Run a worker (see run_worker) on a background thread until no lease is left, and return at once."""
+    def target():
+        close_old_connections()
+        try:
+            run_worker(concurrency, once=True)
+        except Exception:
+            # Leases it held expire and are taken over by the next worker
+            logger.exception('Background scrape worker stopped')
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=target, name='scrape-worker', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,71 @@
+"""
+Periodic upkeep of the scraping tables.
+
+The long-running scrape processes, `run_scrape_worker`, the worker thread of
+the web process (see leases.launch_worker) and `run_scrape_scheduler`, call
+maintain() between pieces of work, so nothing needs a schedule of its own.
+It runs run_maintenance() at most once every SCRAPE_MAINTENANCE_MINUTES per
+process, and in one process at a time: while one holds PURGE_LOCK_KEY, the
+others skip their turn.
+
+run_maintenance():
+- creates the upcoming ScrapeResult partitions and rolls up and drops
+  results beyond the retention horizon (see products.retention);
+- takes the products of inactive stores, and of stores with scraping
+  disabled, off the scrape schedule (see scheduler.schedule_stores);
+- refreshes the stores' reference price change rates (see
+  volatility.refresh_reference_rates);
+- deletes archived pages beyond the archive's age and size limits (see
+  archive.purge_archive), also once SCRAPE_ARCHIVE_ENABLED is turned off.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from . import scheduler, volatility
+from .archive import purge_archive
+from .retention import PURGE_LOCK_KEY, ensure_partitions, purge_results
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_next_run = 0
+
+
+def run_maintenance():
+    created = ensure_partitions()
+    dropped, deleted = purge_results()
+    scheduler.schedule_stores()
+    volatility.refresh_reference_rates()
+    pages, freed = purge_archive()
+    logger.info(
+        'Scrape maintenance: created %d partitions, dropped %d days of results and %d older rows, '
+        'deleted %d archived pages (%.1f MB)',
+        created, dropped, deleted, pages, freed / 1024 / 1024,
+    )
+
+
+def maintain():
+    """Run run_maintenance() if this process is due to and no other process is running it."""
+    global _next_run
+    with _lock:
+        if time.monotonic() < _next_run:
+            return
+        _next_run = time.monotonic() + settings.SCRAPE_MAINTENANCE_MINUTES * 60
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [PURGE_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return
+        try:
+            run_maintenance()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [PURGE_LOCK_KEY])
+    except Exception:
+        # Tried again on the next turn; the scrape work goes on meanwhile
+        logger.exception('Scrape maintenance failed')
@@ -0,0 +1,48 @@
+"""
+Benchmark product page extraction, in pages parsed per second on one core.
+
+Usage:
+    python manage.py bench_parse
+    python manage.py bench_parse --pages 2000 --size-kb 120
+"""
+import time
+from django.core.management.base import BaseCommand
+from products.extraction import DEFAULT_EXTRACTOR, PageExtractor, extract_with_soup
+from products.fake_vendor import synthetic_page
+
+
+class Command(BaseCommand):
+    help = 'Compare the JSON-LD fast path, the lxml rules path and the BeautifulSoup path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1000)
+        parser.add_argument('--size-kb', type=int, default=80, help='Approximate page size')
+
+    def handle(self, *args, **options):
+        pages, size_kb = options['pages'], options['size_kb']
+        json_ld_pages = [synthetic_page(i, size_kb, json_ld=True) for i in range(pages)]
+        markup_pages = [synthetic_page(i, size_kb, json_ld=False) for i in range(pages)]
+        vendor_extractor = PageExtractor([
+            ('price', 'css', 'div.buy-box span.amount', ''),
+            ('stock', 'css', 'div.buy-box span.qty', ''),
+            ('title', 'xpath', '//div[@class="buy-box"]/h2', ''),
+        ])
+
+        cases = [
+            ('json-ld fast path', DEFAULT_EXTRACTOR.extract, json_ld_pages, 'json-ld'),
+            ('lxml default rules', DEFAULT_EXTRACTOR.extract, markup_pages, 'lxml'),
+            ('lxml vendor rules', vendor_extractor.extract, markup_pages, 'lxml'),
+            ('bs4 (json-ld page)', extract_with_soup, json_ld_pages, 'bs4'),
+            ('bs4 (markup page)', extract_with_soup, markup_pages, 'bs4'),
+        ]
+        self.stdout.write(f"{pages} pages of ~{size_kb} KB")
+        for label, extract, page_set, parser in cases:
+            start = time.perf_counter()
+            for page in page_set:
+                data = extract(page)
+            elapsed = time.perf_counter() - start
+            assert data['parser'] == parser and data['price'] is not None, (label, data)
+            self.stdout.write(
+                f"{label:<20} {pages / elapsed:10.0f} pages/sec  {elapsed / pages * 1000:8.2f} ms/page"
+            )
+
@@ -0,0 +1,204 @@
+"""
+Benchmark the scrape pipeline against a local fake vendor site, without the
+network.
+
+Creates a throwaway store of --products products whose source_urls point at
+run_fake_vendor (started here, unless --url names one already running),
+then scrapes it --runs times the way POST /products/scrape does: queued in
+ScrapeLeases by queue_scrape and scraped by a lease worker (run_worker
+--once) in this process. The first run fetches every page; later ones
+revalidate them with the validators the first stored.
+
+The worker takes any lease queued, so run it against a database no other
+scrapes are queued on.
+
+Reports per run: pages/sec, p50 and p99 fetch latency, parse time per page
+and database flush time. Fetch latency is as the engine sees it, including
+any wait for one of the host's pooled connections (see --per-host); parse
+time likewise includes any wait for a parse worker (SCRAPE_PARSE_WORKERS).
+
+Usage:
+    python manage.py bench_scrape
+    python manage.py bench_scrape --products 20000 --latency 0.2 --error-rate 0.02 --runs 3
+    python manage.py bench_scrape --url http://127.0.0.1:8081 --concurrency 128
+"""
+import functools
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from marketplace.models import Marketplace, Store
+from vendor.models import Vendor
+from products.leases import queue_scrape, run_worker
+from products.models import Product, Scrape, ScrapeResult
+from products.scraping import ScrapeBatch, ScrapeEngine
+from .run_fake_vendor import add_fake_vendor_arguments
+
+
+class Command(BaseCommand):
+    help = 'Measure scraping throughput, fetch latency, parse and flush time against a fake vendor site'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--runs', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--per-host', type=int, default=None, help='Connections to the fake vendor host')
+        parser.add_argument('--url', default=None, help='Base URL of a running fake vendor; otherwise one is started')
+        add_fake_vendor_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['url']:
+            self.bench(options['url'], options)
+            return
+        server, url = start_fake_vendor(options)
+        try:
+            self.bench(url, options)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def bench(self, url, options):
+        tag = uuid.uuid4().hex[:8]
+        marketplace = Marketplace.objects.create(code=f'bench-{tag}', name=f'Bench {tag}')
+        store = Store.objects.create(marketplace=marketplace, name=f'Bench {tag}')
+        vendor = Vendor.objects.create(name=f'Bench {tag}', code=f'bench-{tag}')
+        Product.objects.bulk_create(
+            [
+                Product(
+                    vendor=vendor,
+                    store=store,
+                    marketplace=marketplace,
+                    vendor_sku=f'SKU-{i:08d}',
+                    source_url=f'{url.rstrip("/")}/products/{i}',
+                )
+                for i in range(options['products'])
+            ],
+            batch_size=5000,
+        )
+
+        try:
+            self.stdout.write(
+                f"{options['products']} products, {options['page_kb']} KB {options['template']} pages, "
+                f"{options['latency'] * 1000:.0f} ms latency, {options['error_rate']:.0%} errors, "
+                f"etag {options['etag']}"
+            )
+            for run in range(1, options['runs'] + 1):
+                self.run(run, store, options['concurrency'], options['per_host'])
+        finally:
+            with connection.cursor() as cursor:
+                # Raw deletes: the ORM cascade would load every row into memory.
+                cursor.execute(
+                    f'DELETE FROM {ScrapeResult._meta.db_table} WHERE scrape_id IN '
+                    f'(SELECT id FROM {Scrape._meta.db_table} WHERE store_id = %s)',
+                    [store.id],
+                )
+                cursor.execute(f'DELETE FROM {Product._meta.db_table} WHERE vendor_id = %s', [vendor.id])
+            vendor.delete()
+            marketplace.delete()
+
+    def run(self, run, store, concurrency, per_host):
+        timings = {'fetch': [], 'parse': [], 'flush': [], 'flushed': []}
+        scrape = Scrape.objects.create(store=store, status='pending')
+
+        start = time.perf_counter()
+        queue_scrape(scrape)
+        run_worker(concurrency, once=True, engine_class=functools.partial(
+            TimedScrapeEngine, timings=timings, per_host=per_host,
+        ))
+        elapsed = time.perf_counter() - start
+
+        scrape.refresh_from_db()
+        pages = scrape.successful_scrapes + scrape.failed_scrapes
+        fetch, parse, flush = timings['fetch'], timings['parse'], timings['flush']
+        self.stdout.write(
+            f"run {run}: {pages} pages in {elapsed:.1f}s  {pages / elapsed:8.0f} pages/sec  "
+            f"({scrape.not_modified_scrapes} not modified, {scrape.failed_scrapes} failed)\n"
+            f"  fetch  p50 {percentile(fetch, 0.5) * 1000:7.1f} ms  p99 {percentile(fetch, 0.99) * 1000:7.1f} ms\n"
+            f"  parse  {mean(parse) * 1000:7.2f} ms/page  p99 {percentile(parse, 0.99) * 1000:7.2f} ms"
+            f"  ({len(parse)} pages)\n"
+            f"  flush  {sum(flush):7.2f}s in {len(flush)} flushes  {mean(flush) * 1000:7.1f} ms/flush  "
+            f"{sum(flush) / max(sum(timings['flushed']), 1) * 1000:6.3f} ms/result"
+        )
+
+
+class TimedScrapeEngine(ScrapeEngine):
+    """A ScrapeEngine recording how long each fetch, parse and flush takes."""
+
+    def __init__(self, source, timings, **kwargs):
+        self.timings = timings
+        super().__init__(source, **kwargs)
+
+    def new_batch(self):
+        return TimedScrapeBatch(self.timings)
+
+    async def fetch(self, session, product):
+        start = time.perf_counter()
+        try:
+            return await super().fetch(session, product)
+        finally:
+            self.timings['fetch'].append(time.perf_counter() - start)
+
+    async def extract(self, product, body):
+        start = time.perf_counter()
+        try:
+            return await super().extract(product, body)
+        finally:
+            self.timings['parse'].append(time.perf_counter() - start)
+
+
+class TimedScrapeBatch(ScrapeBatch):
+    def __init__(self, timings):
+        super().__init__()
+        self.timings = timings
+
+    def write(self, connection_stats):
+        start = time.perf_counter()
+        super().write(connection_stats)
+        self.timings['flush'].append(time.perf_counter() - start)
+        self.timings['flushed'].append(len(self.results))
+
+
+def start_fake_vendor(options):
+    """Start run_fake_vendor on a free port; returns (process, base URL)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    command = [
+        sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_fake_vendor',
+        '--port', str(port),
+        '--latency', str(options['latency']),
+        '--jitter', str(options['jitter']),
+        '--error-rate', str(options['error_rate']),
+        '--page-kb', str(options['page_kb']),
+        '--change-rate', str(options['change_rate']),
+        '--etag', options['etag'],
+        '--template', options['template'],
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise CommandError('The fake vendor server did not start')
+            time.sleep(0.1)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
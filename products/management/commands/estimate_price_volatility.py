@@ -0,0 +1,90 @@
+"""
+Rebuild product price change rate estimates from ScrapeResult history and
+reschedule the products accordingly.
+
+Scrapes keep the estimates up to date as they run; this is for products
+scraped before adaptive scheduling, or after changing
+SCRAPE_VOLATILITY_HALF_LIFE_DAYS.
+
+Usage:
+    python manage.py estimate_price_volatility
+    python manage.py estimate_price_volatility --store 3
+"""
+from django.core.management.base import BaseCommand
+from marketplace.models import Store
+from products import volatility
+from products.models import Product, ScrapeResult
+
+
+class Command(BaseCommand):
+    help = 'Estimate how often each product\'s price changes from its scrape history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, default=None, help='Only this store\'s products')
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(last_scraped__isnull=False)
+        results = ScrapeResult.objects.filter(success=True, scraped_price__isnull=False)
+        stores = Store.objects.all()
+        if options['store']:
+            products = products.filter(store_id=options['store'])
+            results = results.filter(product__store_id=options['store'])
+            stores = stores.filter(pk=options['store'])
+
+        estimated = self.estimate(results)
+        volatility.refresh_reference_rates(stores)
+        self.reschedule(products)
+        self.stdout.write(f"Estimated price volatility for {estimated} products")
+
+    def estimate(self, results):
+        """Replay each product's successful scrapes in order into its volatility totals."""
+        pending = []
+        estimated = 0
+        current_id = None
+        for product_id, price, scraped_at in (
+            results.order_by('product_id', 'created_at')
+            .values_list('product_id', 'scraped_price', 'created_at')
+            .iterator(chunk_size=5000)
+        ):
+            if product_id != current_id:
+                if current_id is not None:
+                    pending.append(Product(pk=current_id, price_changes_observed=changes, price_hours_observed=hours))
+                current_id, changes, hours = product_id, 0.0, 0.0
+            else:
+                gap_hours = (scraped_at - last_at).total_seconds() / 3600
+                changes, hours = volatility.observe(changes, hours, gap_hours, price != last_price)
+            last_price, last_at = price, scraped_at
+
+            if len(pending) >= 1000:
+                estimated += write(pending, ['price_changes_observed', 'price_hours_observed'])
+                pending = []
+        if current_id is not None:
+            pending.append(Product(pk=current_id, price_changes_observed=changes, price_hours_observed=hours))
+        return estimated + write(pending, ['price_changes_observed', 'price_hours_observed'])
+
+    def reschedule(self, products):
+        """Set next_scrape_at to one adapted interval after each product's last scrape."""
+        pending = []
+        for product in products.values(
+            'id',
+            'last_scraped',
+            'price_changes_observed',
+            'price_hours_observed',
+            'store__scraping_interval_hours',
+            'store__min_scraping_interval_hours',
+            'store__max_scraping_interval_hours',
+            'store__price_change_reference_rate',
+        ).iterator(chunk_size=5000):
+            pending.append(Product(
+                pk=product['id'],
+                next_scrape_at=volatility.next_scrape_time(product, product['last_scraped']),
+            ))
+            if len(pending) >= 1000:
+                write(pending, ['next_scrape_at'])
+                pending = []
+        write(pending, ['next_scrape_at'])
+
+
+def write(products, fields):
+    Product.objects.bulk_update(products, fields, batch_size=1000)
+    return len(products)
@@ -0,0 +1,23 @@
+"""
+Delete archived scrape pages beyond the retention limits now. Scrape workers
+and the scheduler already do this every SCRAPE_MAINTENANCE_MINUTES (see
+products.maintenance).
+
+Usage:
+    python manage.py purge_scrape_archive
+    python manage.py purge_scrape_archive --max-age-days 7 --max-mb 1024
+"""
+from django.core.management.base import BaseCommand
+from products.archive import purge_archive
+
+
+class Command(BaseCommand):
+    help = 'Delete archived scrape pages older or beyond the size cap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, default=None, help='Defaults to SCRAPE_ARCHIVE_MAX_AGE_DAYS')
+        parser.add_argument('--max-mb', type=int, default=None, help='Defaults to SCRAPE_ARCHIVE_MAX_MB')
+
+    def handle(self, *args, **options):
+        deleted, freed = purge_archive(options['max_age_days'], options['max_mb'])
+        self.stdout.write(f"Deleted {deleted} archived pages ({freed / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,30 @@
+"""
+Create upcoming ScrapeResult partitions and roll up and drop results beyond
+the retention horizon now. Scrape workers and the scheduler already do this
+every SCRAPE_MAINTENANCE_MINUTES (see products.maintenance); run it where
+neither runs for SCRAPE_RESULT_PARTITION_DAYS_AHEAD days. Overlapping runs
+are safe.
+
+Usage:
+    python manage.py purge_scrape_results
+    python manage.py purge_scrape_results --retention-days 30
+"""
+from django.core.management.base import BaseCommand
+from products.retention import ensure_partitions, purge_results
+
+
+class Command(BaseCommand):
+    help = 'Roll up and drop scrape results older than the retention horizon'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=None, help='Defaults to SCRAPE_RESULT_RETENTION_DAYS'
+        )
+
+    def handle(self, *args, **options):
+        created = ensure_partitions()
+        dropped, deleted = purge_results(options['retention_days'])
+        self.stdout.write(
+            f"Created {created} partitions; dropped {dropped} days of results "
+            f"and {deleted} older rows, rolled up into daily summaries"
+        )
@@ -0,0 +1,37 @@
+"""
+Re-run extraction over a past scrape's archived pages, e.g. after fixing a
+vendor's ExtractionRules, without fetching anything again.
+
+Usage:
+    python manage.py reparse_scrape --scrape 42
+    python manage.py reparse_scrape --scrape 42 --vendor 3
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Scrape
+from products.reparse import reparse_scrape
+
+
+class Command(BaseCommand):
+    help = 'Re-parse a scrape\'s archived pages with the current extraction rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scrape', type=int, required=True, help='Scrape ID')
+        parser.add_argument('--vendor', type=int, default=None, help='Only this vendor\'s products')
+
+    def handle(self, *args, **options):
+        try:
+            scrape = Scrape.objects.get(pk=options['scrape'])
+        except Scrape.DoesNotExist:
+            raise CommandError(f"Scrape {options['scrape']} does not exist")
+
+        start = time.perf_counter()
+        counts = reparse_scrape(scrape, vendor_id=options['vendor'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Re-parsed {counts['reparsed']} results in {elapsed:.1f}s "
+            f"({counts['reparsed'] / elapsed if elapsed else 0:.0f} pages/sec): "
+            f"{counts['recovered']} recovered, {counts['broken']} broken, "
+            f"{counts['changed']} changed, {counts['skipped']} without an archived page"
+        )
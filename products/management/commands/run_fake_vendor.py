@@ -0,0 +1,51 @@
+"""
+Serve a fake vendor site on localhost, to scrape without the network (see
+products.fake_vendor).
+
+Usage:
+    python manage.py run_fake_vendor --port 8081
+    python manage.py run_fake_vendor --latency 0.2 --error-rate 0.02 --change-rate 0.1 --etag weak
+    python manage.py run_fake_vendor --template page.html
+"""
+from aiohttp import web
+from django.core.management.base import BaseCommand
+from products.fake_vendor import ETAG_MODES, FakeVendor
+
+
+class Command(BaseCommand):
+    help = 'Serve synthetic product pages at /products/<id>'
+
+    def add_arguments(self, parser):
+        add_fake_vendor_arguments(parser)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+
+    def handle(self, *args, **options):
+        vendor = fake_vendor_from_options(options)
+        self.stdout.write(f"Serving fake vendor pages at http://{options['host']}:{options['port']}/products/<id>")
+        web.run_app(vendor.app(), host=options['host'], port=options['port'], print=None)
+
+
+def add_fake_vendor_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Latency spread, as a share of it')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered HTTP 503')
+    parser.add_argument('--page-kb', type=int, default=80, help='Approximate page size')
+    parser.add_argument('--change-rate', type=float, default=0.0, help='Chance a request finds a new price')
+    parser.add_argument('--etag', choices=ETAG_MODES, default='strong', help='Cache validator behaviour')
+    parser.add_argument(
+        '--template', default='json-ld',
+        help='json-ld, markup, or an HTML file with $id $sku $title $price $stock placeholders',
+    )
+
+
+def fake_vendor_from_options(options):
+    return FakeVendor(
+        latency=options['latency'],
+        jitter=options['jitter'],
+        error_rate=options['error_rate'],
+        page_kb=options['page_kb'],
+        change_rate=options['change_rate'],
+        etag=options['etag'],
+        template=options['template'],
+    )
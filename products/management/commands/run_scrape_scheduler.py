@@ -0,0 +1,20 @@
+"""
+Scrape products continuously as they fall due, until interrupted.
+
+Usage:
+    python manage.py run_scrape_scheduler
+    python manage.py run_scrape_scheduler --concurrency 128
+"""
+from django.core.management.base import BaseCommand
+from products.scheduler import run_scheduler
+
+
+class Command(BaseCommand):
+    help = 'Scrape due products across all stores, most overdue first (stop with Ctrl-C or SIGTERM)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None, help='Concurrent fetches')
+
+    def handle(self, *args, **options):
+        run_scheduler(concurrency=options['concurrency'])
+        self.stdout.write('Scrape scheduler stopped')
@@ -0,0 +1,21 @@
+"""
+Scrape leased batches of queued Scrapes. Run one per container; workers
+coordinate through the database.
+
+Usage:
+    python manage.py run_scrape_worker
+    python manage.py run_scrape_worker --once --concurrency 32
+"""
+from django.core.management.base import BaseCommand
+from products.leases import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Claim and scrape leases of queued Scrapes until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None, help='Concurrent fetches')
+        parser.add_argument('--once', action='store_true', help='Exit when no lease is left instead of polling')
+
+    def handle(self, *args, **options):
+        run_worker(concurrency=options['concurrency'], once=options['once'], stdout=self.stdout)
@@ -0,0 +1,42 @@
+"""
+Run a product scrape in the foreground.
+
+Usage:
+    python manage.py scrape --store 3
+    python manage.py scrape --store 3 --vendor 7
+    python manage.py scrape --scrape 42
+"""
+from django.core.management.base import BaseCommand, CommandError
+from marketplace.models import Store
+from products.models import Scrape
+from products.scraping import run_scrape
+
+
+class Command(BaseCommand):
+    help = 'Scrape the source pages of a store\'s products (or run an existing pending Scrape)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, help='Store to scrape')
+        parser.add_argument('--vendor', type=int, default=None, help='Only scrape this vendor\'s products')
+        parser.add_argument('--scrape', type=int, default=None, help='Run this existing Scrape instead')
+
+    def handle(self, *args, **options):
+        if options['scrape']:
+            scrape = Scrape.objects.filter(pk=options['scrape']).first()
+            if scrape is None:
+                raise CommandError(f"Scrape {options['scrape']} does not exist")
+        elif options['store']:
+            if not Store.objects.filter(pk=options['store']).exists():
+                raise CommandError(f"Store {options['store']} does not exist")
+            scrape = Scrape.objects.create(store_id=options['store'], vendor_id=options['vendor'])
+        else:
+            raise CommandError('Pass --store or --scrape')
+
+        run_scrape(scrape)
+        scrape.refresh_from_db()
+        elapsed = (scrape.completed_at - scrape.started_at).total_seconds()
+        self.stdout.write(
+            f"Scrape {scrape.id}: {scrape.successful_scrapes} succeeded, {scrape.failed_scrapes} failed "
+            f"of {scrape.total_products} in {elapsed:.1f}s "
+            f"({(scrape.successful_scrapes + scrape.failed_scrapes) / max(elapsed, 1e-9) * 3600:.0f} products/hour)"
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Fingerprint of the uploaded fields, used to skip unchanged rows on re-upload', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='changed_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='new_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='unchanged_rows',
+            field=models.IntegerField(default=0),
+        ),
+    ]
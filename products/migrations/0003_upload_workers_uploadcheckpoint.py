@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_content_hash_upload_changed_rows_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='workers',
+            field=models.IntegerField(default=1, help_text='Number of partitions (worker processes) the file is ingested with'),
+        ),
+        migrations.CreateModel(
+            name='UploadCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.IntegerField(default=0)),
+                ('last_row', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='products.upload')),
+            ],
+            options={
+                'verbose_name': 'Upload Checkpoint',
+                'verbose_name_plural': 'Upload Checkpoints',
+                'unique_together': {('upload', 'partition')},
+            },
+        ),
+    ]
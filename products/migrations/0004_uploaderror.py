@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_upload_workers_uploadcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('error_type', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='products.upload')),
+            ],
+            options={
+                'verbose_name': 'Upload Error',
+                'verbose_name_plural': 'Upload Errors',
+                'ordering': ['row_number'],
+                'indexes': [models.Index(fields=['upload', 'row_number'], name='products_up_upload__768dd0_idx'), models.Index(fields=['upload', 'error_type', 'row_number'], name='products_up_upload__eb4112_idx')],
+            },
+        ),
+    ]
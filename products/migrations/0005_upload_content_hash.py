@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+        ('products', '0004_uploaderror'),
+        ('vendor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the uploaded file content', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='upload',
+            index=models.Index(fields=['vendor', 'store', 'content_hash'], name='products_up_vendor__a7ffba_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_upload_queued_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape',
+            name='connections_opened',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scrape',
+            name='connections_reused',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_scrape_connection_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='http_etag',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='http_last_modified',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='scrape',
+            name='not_modified_scrapes',
+            field=models.IntegerField(default=0, help_text='Successful scrapes answered 304 Not Modified (page unchanged)'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+        ('products', '0008_conditional_get_cache'),
+        ('vendor', '0003_extractionrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='next_scrape_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the scrape scheduler next considers this product due'),
+        ),
+        # Products already scraped are next due one store interval after
+        # their last scrape; the rest keep the default (due now).
+        migrations.RunSQL(
+            sql="""
+                UPDATE products_product AS p
+                SET next_scrape_at = p.last_scraped + s.scraping_interval_hours * INTERVAL '1 hour'
+                FROM marketplace_store AS s
+                WHERE p.store_id = s.id AND p.last_scraped IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_scrape_at'], name='product_next_scrape_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_next_scrape_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_changes_observed',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_hours_observed',
+            field=models.FloatField(default=0),
+        ),
+    ]
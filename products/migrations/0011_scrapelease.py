@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_price_volatility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_product_id', models.BigIntegerField()),
+                ('last_product_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('done', 'Done')], default='pending', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('scrape', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='products.scrape')),
+            ],
+            options={
+                'verbose_name': 'Scrape Lease',
+                'verbose_name_plural': 'Scrape Leases',
+                'indexes': [models.Index(fields=['status', 'lease_expires_at'], name='products_sc_status_f5648e_idx')],
+            },
+        ),
+    ]
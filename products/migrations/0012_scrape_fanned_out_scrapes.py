@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_scrapelease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape',
+            name='fanned_out_scrapes',
+            field=models.IntegerField(default=0, help_text="Products of the same vendor page updated from another product's fetch"),
+        ),
+    ]
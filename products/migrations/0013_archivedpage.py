@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_scrape_fanned_out_scrapes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPage',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file_path', models.CharField(max_length=500)),
+                ('size', models.IntegerField(help_text='Uncompressed size in bytes')),
+                ('compressed_size', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='When a scrape last fetched this content')),
+            ],
+            options={
+                'verbose_name': 'Archived Page',
+                'verbose_name_plural': 'Archived Pages',
+            },
+        ),
+        migrations.AddField(
+            model_name='scraperesult',
+            name='page',
+            field=models.ForeignKey(blank=True, help_text='The archived page this result was parsed from, if archiving is enabled', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='products.archivedpage'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_archivedpage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrape',
+            name='unchanged_scrapes',
+            field=models.IntegerField(default=0, help_text='Products (fanned out ones included) found as last scraped, with no ScrapeResult written (SCRAPE_SKIP_UNCHANGED_RESULTS)'),
+        ),
+    ]
@@ -0,0 +1,175 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+COLUMNS = """
+    "scraped_price" numeric(10, 2) NULL,
+    "scraped_stock" integer NULL,
+    "scraped_title" varchar(500) NOT NULL,
+    "scraped_data" jsonb NOT NULL,
+    "success" boolean NOT NULL,
+    "error_message" text NOT NULL,
+    "created_at" timestamp with time zone NOT NULL,
+    "product_id" bigint NOT NULL
+        CONSTRAINT "products_scraperesul_product_id_453bb0e1_fk_products_"
+        REFERENCES "products_product" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "scrape_id" bigint NOT NULL
+        CONSTRAINT "products_scraperesult_scrape_id_89501622_fk_products_scrape_id"
+        REFERENCES "products_scrape" ("id") DEFERRABLE INITIALLY DEFERRED,
+    "page_id" varchar(64) NULL
+        CONSTRAINT "products_scraperesul_page_id_508c0f49_fk_products_"
+        REFERENCES "products_archivedpage" ("content_hash") DEFERRABLE INITIALLY DEFERRED
+"""
+
+COLUMN_NAMES = (
+    '"id", "scraped_price", "scraped_stock", "scraped_title", "scraped_data", "success", '
+    '"error_message", "created_at", "product_id", "scrape_id", "page_id"'
+)
+
+INDEXES = """
+    CREATE INDEX "products_scraperesult_product_id_453bb0e1" ON "products_scraperesult" ("product_id");
+    CREATE INDEX "products_scraperesult_scrape_id_89501622" ON "products_scraperesult" ("scrape_id");
+    CREATE INDEX "products_scraperesult_page_id_508c0f49" ON "products_scraperesult" ("page_id");
+    CREATE INDEX "products_scraperesult_page_id_508c0f49_like"
+        ON "products_scraperesult" ("page_id" varchar_pattern_ops);
+"""
+
+
+def replace_table(cursor, create_table):
+    """Move products_scraperesult's rows into a new table created by create_table."""
+    cursor.execute('ALTER TABLE "products_scraperesult" RENAME TO "products_scraperesult_old"')
+    cursor.execute('ALTER INDEX "products_scraperesult_pkey" RENAME TO "products_scraperesult_old_pkey"')
+    for constraint in ('product_id_453bb0e1', 'scrape_id_89501622', 'page_id_508c0f49'):
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = 'products_scraperesult_old'::regclass "
+            "AND contype = 'f' AND conname LIKE %s",
+            [f'%{constraint}%'],
+        )
+        for name, in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE "products_scraperesult_old" DROP CONSTRAINT "{name}"')
+    cursor.execute('SELECT min(created_at), max(id) FROM "products_scraperesult_old"')
+    first, max_id = cursor.fetchone()
+
+    create_table(cursor, first)
+    cursor.execute(
+        f'INSERT INTO "products_scraperesult" ({COLUMN_NAMES}) '
+        f'SELECT {COLUMN_NAMES} FROM "products_scraperesult_old"'
+    )
+    # Check the copied rows' foreign keys now; indexes cannot be built
+    # while the checks are pending
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+    cursor.execute('DROP TABLE "products_scraperesult_old"')
+    cursor.execute(INDEXES)
+    return max_id
+
+
+def partition_scrape_results(apps, schema_editor):
+    """
+    Rebuild products_scraperesult partitioned by day of created_at (see
+    products.retention). The primary key becomes (id, created_at), as a
+    partitioned table's must include the partition key, and id takes its
+    values from a sequence rather than an identity column.
+    """
+    def create_table(cursor, first):
+        cursor.execute(f"""
+            CREATE TABLE "products_scraperesult" (
+                "id" bigint NOT NULL,
+                {COLUMNS},
+                PRIMARY KEY ("id", "created_at")
+            ) PARTITION BY RANGE ("created_at")
+        """)
+        cursor.execute('CREATE TABLE "products_scraperesult_default" PARTITION OF "products_scraperesult" DEFAULT')
+        # Daily partitions for the last 90 days of existing results and the
+        # week ahead; anything older goes to the default partition
+        today = timezone.localdate()
+        day = max(timezone.localtime(first).date() if first else today, today - datetime.timedelta(days=90))
+        while day <= today + datetime.timedelta(days=7):
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+            cursor.execute(
+                f'CREATE TABLE "products_scraperesult_p{day:%Y%m%d}" PARTITION OF "products_scraperesult" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [start, start + datetime.timedelta(days=1)],
+            )
+            day += datetime.timedelta(days=1)
+
+    with schema_editor.connection.cursor() as cursor:
+        max_id = replace_table(cursor, create_table)
+        cursor.execute('CREATE SEQUENCE "products_scraperesult_id_seq" OWNED BY "products_scraperesult"."id"')
+        cursor.execute(
+            'ALTER TABLE "products_scraperesult" '
+            'ALTER COLUMN "id" SET DEFAULT nextval(\'"products_scraperesult_id_seq"\')'
+        )
+        if max_id is not None:
+            cursor.execute("SELECT setval('\"products_scraperesult_id_seq\"', %s)", [max_id])
+
+
+def unpartition_scrape_results(apps, schema_editor):
+    def create_table(cursor, first):
+        cursor.execute(f"""
+            CREATE TABLE "products_scraperesult" (
+                "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+                {COLUMNS}
+            )
+        """)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS "scrape_result_product_idx"')
+        max_id = replace_table(cursor, create_table)
+        # The identity sequence was named while the partitioned table's
+        # still existed
+        cursor.execute("SELECT pg_get_serial_sequence('products_scraperesult', 'id')")
+        cursor.execute(f'ALTER SEQUENCE {cursor.fetchone()[0]} RENAME TO "products_scraperesult_id_seq"')
+        if max_id is not None:
+            cursor.execute(
+                'ALTER TABLE "products_scraperesult" ALTER COLUMN "id" RESTART WITH %s', [max_id + 1]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_scrape_unchanged_scrapes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_scrape_results, unpartition_scrape_results),
+        migrations.CreateModel(
+            name='DailyScrapeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scrapes', models.IntegerField(default=0)),
+                ('failed_scrapes', models.IntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('min_stock', models.IntegerField(blank=True, null=True)),
+                ('max_stock', models.IntegerField(blank=True, null=True)),
+                ('last_stock', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Scrape Summary',
+                'verbose_name_plural': 'Daily Scrape Summaries',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scraperesult',
+            index=models.Index(fields=['product', '-created_at'], name='scrape_result_product_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyscrapesummary',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='products.product'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyscrapesummary',
+            unique_together={('product', 'date')},
+        ),
+    ]
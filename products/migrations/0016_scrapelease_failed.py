@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_scrape_result_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapelease',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='scrapelease',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_scrapelease_failed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Fingerprint of the fields as last uploaded', max_length=32),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_store_adaptive_scraping'),
+        ('products', '0017_product_content_hash_help_text'),
+        ('vendor', '0003_extractionrule'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_next_scrape_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='next_scrape_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, help_text='When the scrape scheduler next considers this product due; unset while its store is inactive or has scraping disabled', null=True),
+        ),
+        # Products of inactive stores or stores with scraping disabled are
+        # not scheduled; on the way back they are all due again.
+        migrations.RunSQL(
+            sql="""
+                UPDATE products_product AS p
+                SET next_scrape_at = NULL
+                FROM marketplace_store AS s
+                WHERE p.store_id = s.id AND NOT (s.is_active AND s.scraping_enabled)
+            """,
+            reverse_sql="UPDATE products_product SET next_scrape_at = now() WHERE next_scrape_at IS NULL",
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('next_scrape_at__isnull', False), models.Q(('source_url', ''), _negated=True)), fields=['next_scrape_at'], name='product_next_scrape_idx'),
+        ),
+    ]
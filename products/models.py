@@ -86,8 +86,33 @@ class Product(models.Model):
     # Status tracking
     is_active = models.BooleanField(default=True)
     last_scraped = models.DateTimeField(null=True, blank=True)
+    next_scrape_at = models.DateTimeField(
+        default=timezone.now,
+        null=True,
+        blank=True,
+        help_text='When the scrape scheduler next considers this product due; '
+                  'unset while its store is inactive or has scraping disabled'
+    )
     scrape_error = models.TextField(blank=True)
     
+    # HTTP cache validators of the last fetched source page, sent back as
+    # If-None-Match / If-Modified-Since on the next scrape
+    http_etag = models.CharField(max_length=255, blank=True)
+    http_last_modified = models.CharField(max_length=64, blank=True)
+    
+    # Exponentially decayed count of observed price changes and of the hours
+    # they were observed over, which set the scrape interval (see
+    # products.volatility)
+    price_changes_observed = models.FloatField(default=0)
+    price_hours_observed = models.FloatField(default=0)
+    
+    # Upload change detection
+    content_hash = models.CharField(
+        max_length=32,
+        blank=True,
+        help_text='Fingerprint of the fields as last uploaded'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -96,6 +121,18 @@ class Product(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
+        indexes = [
+            # Due-work lookups by the scrape scheduler: an ordered range scan
+            # over scheduled, scrapeable products only
+            models.Index(
+                fields=['next_scrape_at'],
+                name='product_next_scrape_idx',
+                condition=(
+                    models.Q(is_active=True, next_scrape_at__isnull=False)
+                    & ~models.Q(source_url='')
+                ),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.vendor_sku} - {self.title or 'No title'}"
@@ -103,10 +140,11 @@ class Product(models.Model):
 
 class Upload(models.Model):
     """
-    Tracks CSV file uploads for bulk product creation.
+    Tracks CSV and Excel file uploads for bulk product creation.
     """
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
@@ -124,11 +162,20 @@ class Upload(models.Model):
     )
     filename = models.CharField(max_length=255)
     file_path = models.CharField(max_length=500, blank=True)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='SHA-256 of the uploaded file content'
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
         default='pending'
     )
+    workers = models.IntegerField(
+        default=1,
+        help_text='Number of partitions (worker processes) the file is ingested with'
+    )
     
     # Processing statistics
     total_rows = models.IntegerField(default=0)
@@ -136,6 +183,11 @@ class Upload(models.Model):
     successful_rows = models.IntegerField(default=0)
     failed_rows = models.IntegerField(default=0)
     
+    # Change detection breakdown of successful_rows
+    new_rows = models.IntegerField(default=0)
+    changed_rows = models.IntegerField(default=0)
+    unchanged_rows = models.IntegerField(default=0)
+    
     # Error tracking
     error_message = models.TextField(blank=True)
     error_details = models.JSONField(default=dict, blank=True)
@@ -150,11 +202,68 @@ class Upload(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Upload'
         verbose_name_plural = 'Uploads'
+        indexes = [
+            models.Index(fields=['vendor', 'store', 'content_hash']),
+        ]
     
     def __str__(self):
         return f"{self.filename} - {self.status}"
 
 
+class UploadCheckpoint(models.Model):
+    """
+    Last committed file row for one partition of an upload.
+    
+    Sequential uploads have a single partition 0. A resumed upload skips every
+    row at or below its partition's last_row.
+    """
+    upload = models.ForeignKey(
+        Upload,
+        on_delete=models.CASCADE,
+        related_name='checkpoints'
+    )
+    partition = models.IntegerField(default=0)
+    last_row = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['upload', 'partition']
+        verbose_name = 'Upload Checkpoint'
+        verbose_name_plural = 'Upload Checkpoints'
+    
+    def __str__(self):
+        return f"Upload {self.upload_id} partition {self.partition} @ row {self.last_row}"
+
+
+class UploadError(models.Model):
+    """
+    A single rejected row from an upload.
+    
+    Row errors live here rather than in Upload.error_details, which only keeps
+    a capped summary.
+    """
+    upload = models.ForeignKey(
+        Upload,
+        on_delete=models.CASCADE,
+        related_name='row_errors'
+    )
+    row_number = models.IntegerField()
+    error_type = models.CharField(max_length=100)
+    message = models.TextField()
+    
+    class Meta:
+        ordering = ['row_number']
+        indexes = [
+            models.Index(fields=['upload', 'row_number']),
+            models.Index(fields=['upload', 'error_type', 'row_number']),
+        ]
+        verbose_name = 'Upload Error'
+        verbose_name_plural = 'Upload Errors'
+    
+    def __str__(self):
+        return f"Upload {self.upload_id} row {self.row_number}: {self.error_type}"
+
+
 class Scrape(models.Model):
     """
     Tracks scraping operations for products.
@@ -188,6 +297,23 @@ class Scrape(models.Model):
     total_products = models.IntegerField(default=0)
     successful_scrapes = models.IntegerField(default=0)
     failed_scrapes = models.IntegerField(default=0)
+    not_modified_scrapes = models.IntegerField(
+        default=0,
+        help_text='Successful scrapes answered 304 Not Modified (page unchanged)'
+    )
+    fanned_out_scrapes = models.IntegerField(
+        default=0,
+        help_text='Products of the same vendor page updated from another product\'s fetch'
+    )
+    unchanged_scrapes = models.IntegerField(
+        default=0,
+        help_text='Products (fanned out ones included) found as last scraped, '
+                  'with no ScrapeResult written (SCRAPE_SKIP_UNCHANGED_RESULTS)'
+    )
+    
+    # HTTP connection pooling
+    connections_opened = models.IntegerField(default=0)
+    connections_reused = models.IntegerField(default=0)
     
     # Error tracking
     error_message = models.TextField(blank=True)
@@ -205,11 +331,92 @@ class Scrape(models.Model):
     
     def __str__(self):
         return f"Scrape {self.id} - {self.status}"
+    
+    @property
+    def cache_hit_ratio(self):
+        """Share of fetched products whose page came back 304 Not Modified."""
+        fetched = self.successful_scrapes + self.failed_scrapes
+        return round(self.not_modified_scrapes / fetched, 4) if fetched else None
+
+
+class ScrapeLease(models.Model):
+    """
+    A batch of a Scrape's products (a product id range) for scrape workers.
+
+    A worker claims a pending lease, or one whose lease_expires_at has passed
+    because its worker died, and renews the lease while it scrapes the batch.
+    A lease that has been claimed SCRAPE_LEASE_MAX_ATTEMPTS times without
+    finishing is failed, and its Scrape with it.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('leased', 'Leased'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    scrape = models.ForeignKey(
+        Scrape,
+        on_delete=models.CASCADE,
+        related_name='leases'
+    )
+    first_product_id = models.BigIntegerField()
+    last_product_id = models.BigIntegerField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+        verbose_name = 'Scrape Lease'
+        verbose_name_plural = 'Scrape Leases'
+
+    def __str__(self):
+        return f"Scrape {self.scrape_id} products {self.first_product_id}-{self.last_product_id} ({self.status})"
+
+
+class ArchivedPage(models.Model):
+    """
+    A fetched page body kept in the scrape archive (see products.archive).
+    
+    Each distinct body is stored once, gzip-compressed, under the SHA-256 of
+    its content; every ScrapeResult that fetched it points here.
+    """
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    file_path = models.CharField(max_length=500)
+    size = models.IntegerField(help_text='Uncompressed size in bytes')
+    compressed_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        help_text='When a scrape last fetched this content'
+    )
+    
+    class Meta:
+        verbose_name = 'Archived Page'
+        verbose_name_plural = 'Archived Pages'
+    
+    def __str__(self):
+        return f"{self.content_hash} ({self.compressed_size} bytes)"
 
 
 class ScrapeResult(models.Model):
     """
     Individual scrape result for a product.
+    
+    The table is partitioned by day of created_at (see products.retention):
+    days beyond SCRAPE_RESULT_RETENTION_DAYS are rolled up into
+    DailyScrapeSummary rows and their partition dropped.
     """
     scrape = models.ForeignKey(
         Scrape,
@@ -221,6 +428,14 @@ class ScrapeResult(models.Model):
         on_delete=models.CASCADE,
         related_name='scrape_results'
     )
+    page = models.ForeignKey(
+        ArchivedPage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='results',
+        help_text='The archived page this result was parsed from, if archiving is enabled'
+    )
     
     # Scraped data
     scraped_price = models.DecimalField(
@@ -243,6 +458,43 @@ class ScrapeResult(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Scrape Result'
         verbose_name_plural = 'Scrape Results'
+        indexes = [
+            # A product's latest results first
+            models.Index(fields=['product', '-created_at'], name='scrape_result_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Result for {self.product.vendor_sku} - {'Success' if self.success else 'Failed'}"
+
+
+class DailyScrapeSummary(models.Model):
+    """
+    One product's ScrapeResults of one day, rolled up when the day's detail
+    is purged (see products.retention).
+    
+    Prices and stock are over the day's successful results; last_* are those
+    of its latest one.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_summaries'
+    )
+    date = models.DateField()
+    scrapes = models.IntegerField(default=0)
+    failed_scrapes = models.IntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    min_stock = models.IntegerField(null=True, blank=True)
+    max_stock = models.IntegerField(null=True, blank=True)
+    last_stock = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['product', 'date']
+        ordering = ['-date']
+        verbose_name = 'Daily Scrape Summary'
+        verbose_name_plural = 'Daily Scrape Summaries'
     
     def __str__(self):
-        return f"Result for {self.product.vendor_sku} - {'Success' if self.success else 'Failed'}"
\ No newline at end of file
+        return f"{self.product_id} on {self.date}"
\ No newline at end of file
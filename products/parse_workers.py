@@ -0,0 +1,27 @@
+"""
+Process-pool entry points for parsing scraped pages off the event loop.
+
+Workers are started with the spawn method, so this module must stay importable
+before Django is set up: extraction is only imported inside the functions.
+Compiled selectors cannot be pickled, so each worker compiles the rules it is
+started with.
+"""
+import django
+
+_extractors = {}
+
+
+def init_worker(rules_by_vendor):
+    """Set up Django and compile the vendors' extraction rules in a freshly spawned worker."""
+    global _extractors
+    django.setup()
+    from .extraction import build_extractors
+
+    _extractors = build_extractors(rules_by_vendor)
+
+
+def extract_page(vendor_id, body):
+    """Parse a page with the vendor's extractor (see PageExtractor.extract)."""
+    from .extraction import DEFAULT_EXTRACTOR
+
+    return _extractors.get(vendor_id, DEFAULT_EXTRACTOR).extract(body)
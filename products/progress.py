@@ -0,0 +1,143 @@
+"""
+Scrape progress as a stream of Server-Sent Events.
+
+Instead of polling GET /products/scrapes/{id}, a dashboard opens one
+EventSource on GET /products/scrapes/{id}/events. The stream reads the
+Scrape's counters once per SCRAPE_FLUSH_SECONDS (they cannot change more
+often, see ScrapeBatch.write) and sends a `progress` event whenever they
+moved, carrying the counters, their change since the previous event, the
+current and average throughput and the estimated seconds to completion.
+
+A `complete` event with the final counters ends the stream when the scrape
+completes or fails. A stream also ends after SCRAPE_PROGRESS_STREAM_SECONDS
+so it does not hold a server thread for the whole of a long scrape;
+EventSource reconnects by itself and the new stream starts with the current
+state.
+
+The stream is a plain generator under WSGI and an async generator under
+ASGI, so there it holds no thread at all. Under WSGI the stream closes its
+database connection between reads, so an open stream does not keep one of
+the database's connections for minutes while it mostly sleeps.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+from .models import Scrape
+
+
+PROGRESS_FIELDS = [
+    'status',
+    'total_products',
+    'successful_scrapes',
+    'failed_scrapes',
+    'not_modified_scrapes',
+    'fanned_out_scrapes',
+    'started_at',
+    'completed_at',
+]
+
+# Comment lines sent while nothing changes, so proxies keep the connection
+KEEPALIVE_SECONDS = 15
+
+# Milliseconds EventSource waits before reconnecting
+RECONNECT_MS = 3000
+
+
+class ScrapeProgress:
+    """Turns successive reads of a Scrape's counters into SSE messages."""
+
+    def __init__(self):
+        self.last = None
+        self.last_counters = None
+        self.last_time = None
+        self.last_sent = time.monotonic()
+        self.finished = False
+
+    def message(self, scrape):
+        """The text to send for a fresh read of the scrape (a values() dict), or ''."""
+        now = timezone.now()
+        if scrape is None:
+            self.finished = True
+            return format_event('complete', {'status': 'deleted'})
+        self.finished = scrape['status'] in ('completed', 'failed')
+
+        counters = (scrape['status'], scrape['successful_scrapes'], scrape['failed_scrapes'])
+        if counters == self.last_counters and not self.finished:
+            if time.monotonic() - self.last_sent < KEEPALIVE_SECONDS:
+                return ''
+            self.last_sent = time.monotonic()
+            return ': keepalive\n\n'
+
+        data = self.progress(scrape, now)
+        self.last, self.last_time, self.last_counters = scrape, now, counters
+        self.last_sent = time.monotonic()
+        text = format_event('complete' if self.finished else 'progress', data)
+        return f'retry: {RECONNECT_MS}\n{text}' if data['successful_delta'] is None else text
+
+    def progress(self, scrape, now):
+        done = scrape['successful_scrapes'] + scrape['failed_scrapes']
+        data = {**scrape, 'done': done, 'successful_delta': None, 'failed_delta': None}
+
+        elapsed = 0
+        if scrape['started_at']:
+            elapsed = ((scrape['completed_at'] or now) - scrape['started_at']).total_seconds()
+        average = done / elapsed if elapsed > 0 else None
+        current = average
+        if self.last is not None:
+            data['successful_delta'] = scrape['successful_scrapes'] - self.last['successful_scrapes']
+            data['failed_delta'] = scrape['failed_scrapes'] - self.last['failed_scrapes']
+            interval = (now - self.last_time).total_seconds()
+            if interval > 0 and not scrape['completed_at']:
+                current = (data['successful_delta'] + data['failed_delta']) / interval
+
+        remaining = max(scrape['total_products'] - done, 0)
+        data['products_per_second'] = round(current, 1) if current is not None else None
+        data['average_products_per_second'] = round(average, 1) if average is not None else None
+        data['eta_seconds'] = (
+            0 if self.finished else round(remaining / average) if average else None
+        )
+        return data
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def read_scrape(scrape_id):
+    return Scrape.objects.filter(pk=scrape_id).values(*PROGRESS_FIELDS).first()
+
+
+async def aread_scrape(scrape_id):
+    return await Scrape.objects.filter(pk=scrape_id).values(*PROGRESS_FIELDS).afirst()
+
+
+def events(scrape_id):
+    """The SSE stream of a scrape's progress, for WSGI."""
+    progress = ScrapeProgress()
+    deadline = time.monotonic() + settings.SCRAPE_PROGRESS_STREAM_SECONDS
+    while True:
+        message = progress.message(read_scrape(scrape_id))
+        if message:
+            yield message
+        if progress.finished or time.monotonic() >= deadline:
+            return
+        connection.close()
+        time.sleep(settings.SCRAPE_FLUSH_SECONDS)
+
+
+async def aevents(scrape_id):
+    """The SSE stream of a scrape's progress, for ASGI."""
+    progress = ScrapeProgress()
+    deadline = time.monotonic() + settings.SCRAPE_PROGRESS_STREAM_SECONDS
+    while True:
+        message = progress.message(await aread_scrape(scrape_id))
+        if message:
+            yield message
+        if progress.finished or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(settings.SCRAPE_FLUSH_SECONDS)
@@ -0,0 +1,175 @@
+"""
+Re-running extraction over a past scrape's archived pages.
+
+When a vendor changes its markup, a scrape fails to parse (or parses wrong
+values) until its ExtractionRules are fixed. With SCRAPE_ARCHIVE_ENABLED the
+pages it fetched are still in the archive (see products.archive), so
+reparse_scrape() can apply the fixed rules to them without fetching
+anything again.
+
+Each result is re-extracted from its own page, or for a 304 from the
+product's last archived page before the scrape. Results without a page (a
+failed fetch, or a page since purged) are skipped. The ScrapeResult is
+rewritten in place, the Scrape's counters follow any result that turned
+from failed to successful or back, and the Product and VendorPrice take the
+new values if the result is still the product's latest.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .archive import read_page
+from .extraction import DEFAULT_EXTRACTOR, ExtractionError, load_extractors
+from .models import ArchivedPage, Product, Scrape, ScrapeResult
+from .scraping import describe_error, update_rows, upsert_prices
+
+
+def reparse_scrape(scrape, vendor_id=None, batch_size=500):
+    """
+    Re-extract a scrape's results (only vendor_id's, if given) from their
+    archived pages.
+
+    Returns a Counter of reparsed, recovered (failed before, successful
+    now), broken (the reverse), changed (a different price or stock) and
+    skipped (no archived page) results.
+    """
+    extractors = load_extractors()
+    results = ScrapeResult.objects.filter(scrape=scrape)
+    if vendor_id is not None:
+        results = results.filter(product__vendor_id=vendor_id)
+
+    totals = Counter()
+    last_id = 0
+    while True:
+        chunk = list(
+            results.filter(id__gt=last_id).order_by('id')
+            .select_related('product').only(
+                'id', 'page_id', 'success', 'error_message', 'created_at', 'scraped_data',
+                'scraped_price', 'scraped_stock', 'scraped_title',
+                'product__id', 'product__vendor_id', 'product__vendor_sku', 'product__title',
+            )[:batch_size]
+        )
+        if not chunk:
+            return totals
+        last_id = chunk[-1].id
+        with transaction.atomic():
+            totals += reparse_results(scrape, chunk, extractors)
+
+
+def reparse_results(scrape, results, extractors):
+    pages = result_pages(scrape, results)
+    file_paths = dict(
+        ArchivedPage.objects.filter(pk__in=set(pages.values())).values_list('pk', 'file_path')
+    )
+    bodies = {}
+    counts = Counter()
+    updated = []
+    for result in results:
+        page_id = pages.get(result.id)
+        if page_id not in file_paths:
+            counts['skipped'] += 1
+            continue
+        if page_id not in bodies:
+            bodies[page_id] = read_page(ArchivedPage(pk=page_id, file_path=file_paths[page_id]))
+
+        extractor = extractors.get(result.product.vendor_id, DEFAULT_EXTRACTOR)
+        before = (result.success, result.scraped_price, result.scraped_stock)
+        try:
+            data = extractor.extract(bodies[page_id])
+        except ExtractionError as e:
+            result.success, result.error_message = False, describe_error(e)
+        except Exception as e:
+            result.success, result.error_message = False, f'Could not parse page: {e}'
+        else:
+            result.success, result.error_message = True, ''
+            result.scraped_price = data['price']
+            result.scraped_stock = data['stock']
+            result.scraped_title = data['title'][:500]
+            result.scraped_data = {**result.scraped_data, 'parser': data['parser']}
+        result.scraped_data = {**result.scraped_data, 'reparsed_at': timezone.now().isoformat()}
+        updated.append(result)
+
+        counts['reparsed'] += 1
+        if result.success and not before[0]:
+            counts['recovered'] += 1
+        elif before[0] and not result.success:
+            counts['broken'] += 1
+        elif before != (result.success, result.scraped_price, result.scraped_stock):
+            counts['changed'] += 1
+        if before[0] != result.success and 'fanned_out_from' not in result.scraped_data:
+            delta = 1 if result.success else -1
+            counts['successful_scrapes'] += delta
+            counts['failed_scrapes'] -= delta
+
+    update_rows(ScrapeResult, updated, [
+        'success', 'error_message', 'scraped_price', 'scraped_stock', 'scraped_title', 'scraped_data',
+    ])
+    update_latest(updated)
+    if counts['successful_scrapes']:
+        Scrape.objects.filter(pk=scrape.pk).update(
+            successful_scrapes=F('successful_scrapes') + counts['successful_scrapes'],
+            failed_scrapes=F('failed_scrapes') + counts['failed_scrapes'],
+        )
+    del counts['successful_scrapes'], counts['failed_scrapes']
+    return counts
+
+
+def result_pages(scrape, results):
+    """{result id: ArchivedPage key} for the results that have a page to re-parse."""
+    pages = {result.id: result.page_id for result in results if result.page_id}
+    # A 304's page is the one last archived for the product before the scrape
+    unchanged = {
+        result.product.id: result.id for result in results
+        if not result.page_id and result.success and result.scraped_data.get('http_status') == 304
+    }
+    if unchanged:
+        earlier = (
+            ScrapeResult.objects.filter(
+                product_id__in=list(unchanged),
+                page__isnull=False,
+                created_at__lt=scrape.started_at or scrape.created_at,
+            )
+            .order_by('product_id', '-created_at')
+            .distinct('product_id')
+            .values_list('product_id', 'page_id')
+        )
+        for product_id, page_id in earlier:
+            pages[unchanged[product_id]] = page_id
+    return pages
+
+
+def update_latest(results):
+    """Copy re-parsed values to each Product (and VendorPrice) whose latest result they are."""
+    latest = set(
+        ScrapeResult.objects.filter(product_id__in=[result.product.id for result in results])
+        .order_by('product_id', '-created_at', '-id')
+        .distinct('product_id')
+        .values_list('id', flat=True)
+    )
+    now = timezone.now()
+    scraped = []
+    failed = []
+    prices = {}
+    for result in results:
+        if result.id not in latest:
+            continue
+        product = result.product
+        if result.success:
+            scraped.append(Product(
+                pk=product.id,
+                vendor_price=result.scraped_price,
+                vendor_stock=result.scraped_stock,
+                title=product.title or result.scraped_title,
+                scrape_error='',
+                updated_at=now,
+            ))
+            if result.scraped_price is not None:
+                prices[product.vendor_id, product.vendor_sku] = result.scraped_price
+        else:
+            # As after a failed scrape, the last good price and stock stand
+            failed.append(Product(pk=product.id, scrape_error=result.error_message, updated_at=now))
+    update_rows(Product, scraped, ['vendor_price', 'vendor_stock', 'title', 'scrape_error', 'updated_at'])
+    update_rows(Product, failed, ['scrape_error', 'updated_at'])
+    if prices:
+        upsert_prices(prices)
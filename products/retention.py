@@ -0,0 +1,178 @@
+"""
+Retention of ScrapeResult detail.
+
+The products_scraperesult table is partitioned by range of created_at, one
+partition per day (products_scraperesult_pYYYYMMDD, days in TIME_ZONE),
+with a default partition for rows of days that have none. Partitions are
+created SCRAPE_RESULT_PARTITION_DAYS_AHEAD days ahead, so results land in
+their day's partition as they are written.
+
+Detail older than SCRAPE_RESULT_RETENTION_DAYS is rolled up into one
+DailyScrapeSummary per product and day, after which the day's partition is
+dropped whole, which costs the same however many rows it holds. Old rows in
+the default partition are rolled up and deleted.
+
+Both run as part of the periodic maintenance of the scrape worker and
+scheduler processes (see products.maintenance), never as part of a scrape,
+and on demand through `manage.py purge_scrape_results`. Concurrent runs are
+safe: partition changes are serialized, so partitions already created or
+dropped are skipped and no day is summarized twice.
+"""
+import datetime
+import hashlib
+import logging
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from .models import DailyScrapeSummary, ScrapeResult
+
+
+TABLE = ScrapeResult._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{8}})$')
+
+# Advisory lock held while creating, rolling up and dropping partitions
+PURGE_LOCK_KEY = int.from_bytes(
+    hashlib.blake2b(f'purge:{TABLE}'.encode(), digest_size=8).digest(), 'big', signed=True
+)
+
+# SQLSTATE of creating a partition for a day the default partition holds
+# results of
+CHECK_VIOLATION = '23514'
+
+logger = logging.getLogger(__name__)
+
+ROLL_UP_SQL = """
+    INSERT INTO {summaries} AS s (
+        product_id, date, scrapes, failed_scrapes,
+        min_price, max_price, last_price, min_stock, max_stock, last_stock
+    )
+    SELECT
+        product_id,
+        (created_at AT TIME ZONE %s)::date,
+        count(*),
+        count(*) FILTER (WHERE NOT success),
+        min(scraped_price) FILTER (WHERE success),
+        max(scraped_price) FILTER (WHERE success),
+        (array_agg(scraped_price ORDER BY created_at DESC, id DESC) FILTER (WHERE success))[1],
+        min(scraped_stock) FILTER (WHERE success),
+        max(scraped_stock) FILTER (WHERE success),
+        (array_agg(scraped_stock ORDER BY created_at DESC, id DESC) FILTER (WHERE success))[1]
+    FROM {results}
+    WHERE created_at < %s
+    GROUP BY 1, 2
+    ON CONFLICT (product_id, date) DO UPDATE SET
+        scrapes = s.scrapes + EXCLUDED.scrapes,
+        failed_scrapes = s.failed_scrapes + EXCLUDED.failed_scrapes,
+        min_price = LEAST(s.min_price, EXCLUDED.min_price),
+        max_price = GREATEST(s.max_price, EXCLUDED.max_price),
+        min_stock = LEAST(s.min_stock, EXCLUDED.min_stock),
+        max_stock = GREATEST(s.max_stock, EXCLUDED.max_stock),
+        last_price = CASE WHEN EXCLUDED.scrapes > EXCLUDED.failed_scrapes
+                          THEN EXCLUDED.last_price ELSE s.last_price END,
+        last_stock = CASE WHEN EXCLUDED.scrapes > EXCLUDED.failed_scrapes
+                          THEN EXCLUDED.last_stock ELSE s.last_stock END
+"""
+
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def partitions():
+    """{day: table name} of the daily partitions that exist."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+    days = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            days[datetime.datetime.strptime(match.group(1), '%Y%m%d').date()] = name
+    return days
+
+
+def ensure_partitions(days_ahead=None):
+    """Create the missing daily partitions from today on; returns how many were created."""
+    days_ahead = settings.SCRAPE_RESULT_PARTITION_DAYS_AHEAD if days_ahead is None else days_ahead
+    existing = partitions()
+    today = timezone.localdate()
+    quote = connection.ops.quote_name
+    created = 0
+    for offset in range(days_ahead + 1):
+        day = today + datetime.timedelta(days=offset)
+        if day in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [PURGE_LOCK_KEY])
+                cursor.execute('SELECT to_regclass(%s)', [quote(partition_name(day))])
+                if cursor.fetchone()[0] is not None:
+                    continue  # Created by another run meanwhile
+                cursor.execute(
+                    f'CREATE TABLE {quote(partition_name(day))} PARTITION OF {quote(TABLE)} '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [day_start(day), day_start(day + datetime.timedelta(days=1))],
+                )
+        except IntegrityError as e:
+            if getattr(e.__cause__, 'pgcode', None) != CHECK_VIOLATION:
+                raise
+            # The default partition already holds results of the day; they
+            # stay there and are purged from it in time.
+            logger.warning('%s holds results of %s; not creating its partition', DEFAULT_PARTITION, day)
+            continue
+        created += 1
+    return created
+
+
+def roll_up(table, before):
+    """Merge the results in table created before `before` into DailyScrapeSummary."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ROLL_UP_SQL.format(summaries=quote(DailyScrapeSummary._meta.db_table), results=quote(table)),
+            [settings.TIME_ZONE, before],
+        )
+
+
+def purge_results(retention_days=None):
+    """
+    Roll up and drop the results of days before the retention horizon.
+
+    Returns (daily partitions dropped, rows deleted from the default
+    partition).
+    """
+    retention_days = settings.SCRAPE_RESULT_RETENTION_DAYS if retention_days is None else retention_days
+    horizon = timezone.localdate() - datetime.timedelta(days=retention_days)
+    cutoff = day_start(horizon)
+    quote = connection.ops.quote_name
+
+    dropped = 0
+    for day, name in sorted(partitions().items()):
+        if day >= horizon:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [PURGE_LOCK_KEY])
+            cursor.execute('SELECT to_regclass(%s)', [quote(name)])
+            if cursor.fetchone()[0] is None:
+                continue  # Dropped by another purge meanwhile
+            roll_up(name, cutoff)
+            cursor.execute(f'DROP TABLE IF EXISTS {quote(name)}')
+        dropped += 1
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [PURGE_LOCK_KEY])
+        roll_up(DEFAULT_PARTITION, cutoff)
+        cursor.execute(f'DELETE FROM {quote(DEFAULT_PARTITION)} WHERE created_at < %s', [cutoff])
+        deleted = cursor.rowcount
+    return dropped, deleted
@@ -0,0 +1,241 @@
+"""
+Staleness-driven scrape scheduler.
+
+Every active product of an active store with scraping enabled is due at
+Product.next_scrape_at, which the scraping engine sets after each fetch to
+an interval adapted to how often the product's price changes, within the
+store's bounds (see products.volatility), and SCRAPE_RETRY_FAILED_MINUTES
+after a failure. Ordering by it orders products by how overdue they are.
+The scheduler claims due products through the partial
+product_next_scrape_idx index, most overdue first, keeps them in a priority
+queue and feeds them continuously to a ScrapeEngine.
+
+Products of inactive stores and stores with scraping disabled have no
+next_scrape_at (see schedule_stores), so they stay out of that index rather
+than being scanned and discarded by every claim.
+
+Claiming pushes next_scrape_at forward by SCRAPE_CLAIM_MINUTES, so a product
+is not claimed again while it is in flight; if the scheduler dies before
+scraping it, it becomes due again once the claim lapses. Claims skip rows
+other schedulers are claiming, so several can run side by side.
+
+Results are recorded against one Scrape per store. It is opened when the
+store's first due product is claimed and completed once everything claimed
+for it has been recorded and nothing more is queued.
+"""
+import asyncio
+import datetime
+import heapq
+import signal
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Product, Scrape
+from .scraping import SCRAPE_PRODUCT_FIELDS, ScrapeEngine, attach_siblings, complete_scrape
+
+
+# Product columns loaded for claimed products and their siblings: what the
+# engine needs, plus the claim's store and the next_scrape_at to restore if
+# the claim is released.
+CLAIM_FIELDS = [*SCRAPE_PRODUCT_FIELDS, 'store_id', 'next_scrape_at']
+
+
+def scheduled_queryset():
+    """Products the scheduler orders by next_scrape_at; served by product_next_scrape_idx."""
+    return Product.objects.filter(
+        is_active=True,
+        next_scrape_at__isnull=False,
+        store__is_active=True,
+        store__scraping_enabled=True,
+    ).exclude(source_url='')
+
+
+def due_queryset(now):
+    """Products due for scraping at now."""
+    return scheduled_queryset().filter(next_scrape_at__lte=now)
+
+
+def schedule_stores(store_ids=None):
+    """
+    Unset next_scrape_at of the products of inactive stores and of stores
+    with scraping disabled, and make the unscheduled products of the other
+    stores due now. Limited to store_ids if given.
+
+    Called when a store is updated; periodic maintenance also catches stores
+    changed elsewhere and products a scrape rescheduled after their store was
+    disabled.
+    """
+    products = Product.objects.all()
+    if store_ids is not None:
+        products = products.filter(store_id__in=store_ids)
+    products.filter(next_scrape_at__isnull=False).exclude(
+        store__is_active=True, store__scraping_enabled=True,
+    ).update(next_scrape_at=None)
+    products.filter(
+        next_scrape_at__isnull=True, store__is_active=True, store__scraping_enabled=True,
+    ).update(next_scrape_at=timezone.now())
+
+
+class ScrapeScheduler:
+    """
+    A never-ending ScrapeEngine source of due products.
+
+    Iterating yields claimed products in next_scrape_at order and sleeps (at
+    most idle_seconds) while nothing is due. Once the priority queue falls
+    below half of claim_size it is refilled straight away if the previous
+    claim came back full, as more is likely due, and otherwise at most once
+    every idle_seconds. stop() ends the iteration after the product in hand.
+    """
+
+    def __init__(self, claim_size=None, idle_seconds=None):
+        self.claim_size = claim_size or settings.SCRAPE_SCHEDULER_CLAIM_SIZE
+        self.idle_seconds = idle_seconds or settings.SCRAPE_SCHEDULER_IDLE_SECONDS
+        self.heap = []
+        self.queued_by_store = Counter()
+        self.open_scrapes = {}
+        self.claimed_full = True
+        self.stopped = asyncio.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        claim_at = 0
+        while not self.stopped.is_set():
+            if len(self.heap) < self.claim_size // 2 and (self.claimed_full or loop.time() >= claim_at):
+                await sync_to_async(self.complete_finished_scrapes)()
+                for product in await sync_to_async(self.claim_due)():
+                    heapq.heappush(self.heap, (product['next_scrape_at'], product['id'], product))
+                claim_at = loop.time() + self.idle_seconds
+
+            if not self.heap:
+                wait = await sync_to_async(self.seconds_until_due)()
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                # Something is due by now
+                claim_at = 0
+                continue
+
+            _, _, product = heapq.heappop(self.heap)
+            self.queued_by_store[product['store_id']] -= 1
+            yield product
+
+    def claim_due(self):
+        """Claim up to claim_size due products, most overdue first, and assign each a Scrape."""
+        now = timezone.now()
+        with transaction.atomic():
+            # SKIP LOCKED: schedulers on other hosts claiming at the same
+            # time take the next due products rather than the same ones.
+            products = list(
+                due_queryset(now)
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('next_scrape_at')
+                .values(*CLAIM_FIELDS)[:self.claim_size]
+            )
+            self.claimed_full = len(products) == self.claim_size
+            if not products:
+                return []
+            # Due products sharing a page are fetched once, under the first.
+            # Its siblings are claimed with it, so that a later claim does
+            # not fetch the page again before their results are written.
+            products = attach_siblings(products, CLAIM_FIELDS)
+            Product.objects.filter(pk__in=[
+                product['id'] for leader in products for product in [leader, *leader['siblings']]
+            ]).update(next_scrape_at=now + datetime.timedelta(minutes=settings.SCRAPE_CLAIM_MINUTES))
+
+            claimed = Counter(product['store_id'] for product in products)
+            for store_id, count in claimed.items():
+                if store_id not in self.open_scrapes:
+                    self.open_scrapes[store_id] = Scrape.objects.create(
+                        store_id=store_id, status='running', started_at=now,
+                    ).pk
+                Scrape.objects.filter(pk=self.open_scrapes[store_id]).update(
+                    total_products=F('total_products') + count
+                )
+            self.queued_by_store.update(claimed)
+
+        for product in products:
+            product['scrape_id'] = self.open_scrapes[product['store_id']]
+        return products
+
+    def complete_finished_scrapes(self):
+        """Complete open Scrapes whose claimed products have all been recorded."""
+        idle = [store_id for store_id in self.open_scrapes if self.queued_by_store[store_id] <= 0]
+        finished = Scrape.objects.filter(
+            pk__in=[self.open_scrapes[store_id] for store_id in idle],
+            total_products__lte=F('successful_scrapes') + F('failed_scrapes'),
+        )
+        for scrape in finished:
+            complete_scrape(scrape)
+            del self.open_scrapes[scrape.store_id]
+
+    def seconds_until_due(self):
+        """Seconds until the next product falls due, between 1 and idle_seconds."""
+        next_due = (
+            scheduled_queryset()
+            .order_by('next_scrape_at')
+            .values_list('next_scrape_at', flat=True)
+            .first()
+        )
+        if next_due is None:
+            return self.idle_seconds
+        return min(max((next_due - timezone.now()).total_seconds(), 1), self.idle_seconds)
+
+    def shutdown(self):
+        """
+        Release the claims on products still queued (they are due again
+        immediately) and close the open Scrapes with what was recorded.
+        """
+        queued = [
+            product
+            for _, _, leader in self.heap
+            for product in [leader, *leader['siblings']]
+        ]
+        self.heap = []
+        if queued:
+            Product.objects.bulk_update(
+                [Product(pk=product['id'], next_scrape_at=product['next_scrape_at']) for product in queued],
+                ['next_scrape_at'],
+                batch_size=1000,
+            )
+        for scrape in Scrape.objects.filter(pk__in=self.open_scrapes.values()):
+            scrape.total_products = scrape.successful_scrapes + scrape.failed_scrapes
+            scrape.save(update_fields=['total_products'])
+            complete_scrape(scrape)
+        self.open_scrapes = {}
+
+
+def run_scheduler(concurrency=None):
+    """
+    Scrape due products until SIGINT or SIGTERM, then finish what is in
+    flight. The periodic maintenance (see products.maintenance) runs
+    alongside, on a thread of its own so it does not hold up flushes.
+    """
+    from .maintenance import maintain
+
+    async def keep_maintaining():
+        while True:
+            await sync_to_async(maintain, thread_sensitive=False)()
+            await asyncio.sleep(settings.SCRAPE_MAINTENANCE_MINUTES * 60)
+
+    async def main():
+        await sync_to_async(schedule_stores)()
+        scheduler = ScrapeScheduler()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, scheduler.stop)
+        maintainer = asyncio.create_task(keep_maintaining())
+        try:
+            await ScrapeEngine(scheduler, concurrency=concurrency).run()
+        finally:
+            maintainer.cancel()
+            await sync_to_async(scheduler.shutdown)()
+
+    asyncio.run(main())
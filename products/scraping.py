@@ -0,0 +1,852 @@
+"""
+Asynchronous scraping engine for product source pages.
+
+The engine fetches product source_urls with aiohttp. Fetches run on a fixed
+pool of worker coroutines, which bounds global concurrency, through a pooled
+keep-alive session per vendor whose connector caps connections per vendor
+and per host (see VendorSessions). Products come from a source: ScrapeSource
+pages through the products of one Scrape, products.leases through one
+leased batch of it on a scrape worker, and products.scheduler feeds
+whatever is due across all stores.
+
+Fetches that fail on the vendor's side (timeouts, connection errors, HTTP
+429 and 5xx) are retried with jittered backoff, and a host failing too
+often is cut off by a circuit breaker so its products fail fast instead of
+holding up the rest (see products.hosts).
+
+Pages are parsed for price, stock and title with the vendor's compiled
+extraction rules (see products.extraction); the scraped title is stored
+only for products uploaded without one. Every product gets a
+ScrapeResult row, or with SCRAPE_SKIP_UNCHANGED_RESULTS only those whose
+price, stock or title changed or whose scrape failed, so the table grows
+with actual changes rather than with the catalog. Results are buffered and
+written in batches, each with a
+single update of the Scrape counters, so the status endpoint shows progress
+while the scrape runs without a round trip per product.
+
+Fetched page bodies can be kept in a compressed archive for re-parsing
+(see products.archive).
+
+Each product keeps the ETag and Last-Modified validators of its last
+fetched page, and later scrapes send them as If-None-Match and
+If-Modified-Since. A 304 means the page is unchanged: nothing is parsed and
+the stored price and stock stand.
+
+A vendor page listed in several stores is fetched once per run and the
+outcome fanned out to every Product listing it (see attach_siblings).
+
+Every outcome also sets Product.next_scrape_at, which the scheduler orders
+due work by: after a fetch, an interval adapted to how often the product's
+price changes (see products.volatility), and SCRAPE_RETRY_FAILED_MINUTES
+after a failure.
+"""
+import asyncio
+import datetime
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DataError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from marketplace.models import Store
+from vendor.models import Vendor, VendorPrice
+from . import parse_workers, volatility
+from .archive import page_hash, store_pages
+from .extraction import DEFAULT_EXTRACTOR, ExtractionError, build_extractors, load_extraction_rules
+from .hosts import HostCircuit, HostFailing, retry_delay
+from .models import Product, Scrape, ScrapeResult
+
+
+# Product columns loaded for each product a scrape fetches.
+SCRAPE_PRODUCT_FIELDS = [
+    'id',
+    'vendor_id',
+    'vendor_sku',
+    'source_url',
+    'title',
+    'vendor_price',
+    'vendor_stock',
+    'http_etag',
+    'http_last_modified',
+    'last_scraped',
+    'scrape_error',
+    'price_changes_observed',
+    'price_hours_observed',
+    'store__scraping_interval_hours',
+    'store__min_scraping_interval_hours',
+    'store__max_scraping_interval_hours',
+    'store__price_change_reference_rate',
+]
+
+# Product fields a successful (non-304) scrape writes.
+SCRAPED_PRODUCT_FIELDS = [
+    'vendor_price',
+    'vendor_stock',
+    'title',
+    'http_etag',
+    'http_last_modified',
+    'last_scraped',
+    'next_scrape_at',
+    'price_changes_observed',
+    'price_hours_observed',
+    'scrape_error',
+    'updated_at',
+]
+
+# Product fields a 304 writes.
+NOT_MODIFIED_PRODUCT_FIELDS = [
+    'last_scraped',
+    'next_scrape_at',
+    'price_changes_observed',
+    'price_hours_observed',
+    'scrape_error',
+    'updated_at',
+]
+
+
+# HTTP statuses that mean the vendor host is in trouble, not the product
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ScrapeError(Exception):
+    """A product page could not be fetched or parsed."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def scrape_queryset(scrape):
+    """Active products with a source_url that a scrape covers."""
+    query = Product.objects.filter(store_id=scrape.store_id, is_active=True).exclude(source_url='')
+    if scrape.vendor_id:
+        query = query.filter(vendor_id=scrape.vendor_id)
+    return query
+
+
+def run_scrape(scrape, engine_class=None):
+    """
+    Run a scrape to completion in the calling thread, on a ScrapeEngine (or
+    engine_class, such as bench_scrape's instrumented one).
+
+    Marks the scrape running, fetches every product it covers and marks it
+    completed (or failed, if the engine itself breaks; per-product errors are
+    recorded on their ScrapeResult and counted in failed_scrapes).
+    """
+    scrape.status = 'running'
+    scrape.started_at = timezone.now()
+    scrape.total_products = scrape_queryset(scrape).count()
+    scrape.save(update_fields=['status', 'started_at', 'total_products'])
+
+    try:
+        asyncio.run((engine_class or ScrapeEngine)(ScrapeSource(scrape)).run())
+    except Exception as e:
+        scrape.status = 'failed'
+        scrape.error_message = str(e)
+        scrape.completed_at = timezone.now()
+        scrape.save(update_fields=['status', 'error_message', 'completed_at'])
+        raise
+
+    complete_scrape(scrape)
+    return scrape
+
+
+def complete_scrape(scrape):
+    """Mark a scrape completed, and record the time on its store."""
+    scrape.status = 'completed'
+    scrape.completed_at = scrape.completed_at or timezone.now()
+    scrape.save(update_fields=['status', 'completed_at'])
+    Store.objects.filter(pk=scrape.store_id).update(last_scrape_time=scrape.completed_at)
+
+
+def attach_siblings(products, fields=SCRAPE_PRODUCT_FIELDS):
+    """
+    Group products that share a vendor page and return one per page.
+
+    Products of one vendor with the same vendor_sku are listings of the same
+    vendor page, in whichever store, so the page is fetched once for all of
+    them. The first product for each page is returned with a 'siblings'
+    list of the others: those later in products, and the active products of
+    other stores with scraping enabled. Siblings are recorded from the
+    returned product's fetch (see ScrapeBatch.fan_out), which also sets their
+    next_scrape_at, so they are not fetched separately. Siblings are loaded
+    with fields.
+    """
+    pages = {}
+    for product in products:
+        leader = pages.setdefault((product['vendor_id'], product['vendor_sku']), product)
+        if leader is product:
+            product['siblings'] = []
+        else:
+            leader['siblings'].append(product)
+    if not pages:
+        return []
+
+    siblings = Product.objects.filter(
+        is_active=True,
+        store__is_active=True,
+        store__scraping_enabled=True,
+        vendor_id__in={vendor_id for vendor_id, _ in pages},
+        vendor_sku__in={vendor_sku for _, vendor_sku in pages},
+    ).exclude(id__in=[product['id'] for product in products])
+    for sibling in siblings.values(*fields):
+        leader = pages.get((sibling['vendor_id'], sibling['vendor_sku']))
+        if leader is not None:
+            leader['siblings'].append(sibling)
+    return list(pages.values())
+
+
+class ScrapeSource:
+    """
+    The products of one Scrape, loaded from the database a page at a time in
+    id order. Iterating yields product dicts of SCRAPE_PRODUCT_FIELDS plus
+    the scrape_id their results belong to.
+    """
+
+    def __init__(self, scrape):
+        self.scrape = scrape
+
+    def queryset(self):
+        return scrape_queryset(self.scrape)
+
+    async def __aiter__(self):
+        after_id = 0
+        while True:
+            page = await sync_to_async(self.next_page)(after_id)
+            if not page:
+                return
+            after_id = page[-1]['id']
+            for product in await sync_to_async(attach_siblings)(page):
+                product['scrape_id'] = self.scrape.pk
+                yield product
+
+    def next_page(self, after_id):
+        return list(
+            self.queryset()
+            .filter(id__gt=after_id)
+            .order_by('id')
+            .values(*SCRAPE_PRODUCT_FIELDS)[:settings.SCRAPE_PAGE_SIZE]
+        )
+
+
+class ScrapeEngine:
+    """
+    Fetches and parses the products a source yields.
+
+    concurrency worker coroutines pull products from a bounded queue that the
+    source fills as it is drained, so memory does not grow with the number
+    of products.
+
+    Outcomes are buffered and written by ScrapeBatch in one transaction per
+    SCRAPE_FLUSH_SIZE products, and at least every SCRAPE_FLUSH_SECONDS.
+    Flushes run in the background while fetching continues, one at a time.
+
+    A fetch failing on the vendor host's side goes back on the queue after
+    a backoff, and hosts failing too often are cut off by their HostCircuit
+    (see products.hosts).
+
+    Pages are parsed on a pool of parse_workers processes (see
+    products.parse_workers), so parsing neither stalls the fetches in
+    flight nor is limited to the one core the event loop runs on. With
+    parse_workers=0 they are parsed on the event loop.
+    """
+
+    def __init__(self, source, concurrency=None, per_host=None, timeout=None, parse_workers=None):
+        self.source = source
+        self.concurrency = concurrency or settings.SCRAPE_CONCURRENCY
+        self.per_host = per_host or settings.SCRAPE_PER_HOST_CONCURRENCY
+        self.timeout = timeout or settings.SCRAPE_TIMEOUT_SECONDS
+        self.parse_workers = settings.SCRAPE_PARSE_WORKERS if parse_workers is None else parse_workers
+        self.parse_pool = None
+        self.batch = self.new_batch()
+        self.flush_task = None
+        self.saved_stats = Counter()
+        self.circuits = defaultdict(HostCircuit)
+        self.retries = set()
+
+    async def run(self):
+        queue = self.queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        limits = await sync_to_async(vendor_connection_limits)()
+        rules = await sync_to_async(load_extraction_rules)()
+        self.extractors = build_extractors(rules)
+
+        async with VendorSessions(limits, self.per_host, self.timeout) as sessions:
+            self.sessions = sessions
+            if self.parse_workers:
+                self.parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=parse_workers.init_worker,
+                    initargs=(rules,),
+                )
+            workers = [
+                asyncio.create_task(self.worker(sessions, queue))
+                for _ in range(self.concurrency)
+            ]
+            drained = asyncio.create_task(self.feed_and_drain(queue))
+            ticker = asyncio.create_task(self.flush_periodically())
+            try:
+                await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+                for task in workers:
+                    if task.done():
+                        # A worker only exits on an error it could not record
+                        # (such as a failed flush); fail the scrape.
+                        drained.cancel()
+                        task.result()
+                await drained
+            finally:
+                ticker.cancel()
+                drained.cancel()
+                for task in [*workers, *self.retries]:
+                    task.cancel()
+                await asyncio.gather(ticker, drained, *workers, *self.retries, return_exceptions=True)
+                # Write what has been scraped, even when stopping early.
+                if self.flush_task is not None:
+                    await asyncio.gather(self.flush_task, return_exceptions=True)
+                if self.parse_pool is not None:
+                    self.parse_pool.shutdown(cancel_futures=True)
+                await self.flush()
+
+    async def feed_and_drain(self, queue):
+        """Queue every product the source yields, then wait until all of them have been scraped."""
+        async for product in self.source:
+            await queue.put(product)
+        await queue.join()
+        while self.retries:
+            await asyncio.gather(*self.retries)
+            await queue.join()
+
+    async def worker(self, sessions, queue):
+        while True:
+            product = await queue.get()
+            try:
+                await self.scrape_product(sessions, product)
+            finally:
+                queue.task_done()
+
+    async def scrape_product(self, sessions, product):
+        host = urlsplit(product['source_url']).netloc
+        circuit = self.circuits[host]
+        was_open = circuit.is_open
+        probe = False
+        try:
+            if not circuit.allow():
+                raise HostFailing(circuit.last_error)
+            # An open circuit only lets its probe through
+            probe = was_open
+            response = await circuit.guard(self.fetch(sessions.get(product['vendor_id']), product))
+        except HostFailing as e:
+            if probe:
+                # The probe was abandoned by a late failure tripping the circuit again
+                circuit.record(False, str(e), probe=True)
+            self.record(self.batch.add_failure, product, f'Skipped: {host} is failing ({e})')
+            return
+        except (ScrapeError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            host_failed = is_host_failure(e)
+            circuit.record(not host_failed, describe_error(e), probe)
+            attempt = product.get('attempt', 1)
+            if host_failed and attempt < settings.SCRAPE_RETRY_ATTEMPTS and not circuit.is_open:
+                self.retry_later(product, attempt)
+                return
+            message = describe_error(e)
+            if attempt > 1:
+                message = f'{message} (after {attempt} attempts)'
+            self.record(self.batch.add_failure, product, message)
+            return
+        circuit.record(True, probe=probe)
+        if response.not_modified:
+            self.record(self.batch.add_not_modified, product, response)
+            return
+
+        try:
+            data = await self.extract(product, response.body)
+        except ExtractionError as e:
+            # The page is archived with the failure, so it can be re-parsed
+            # once the vendor's rules are fixed
+            self.record(self.batch.add_failure, product, describe_error(e), response)
+            return
+        except Exception as e:
+            self.record(self.batch.add_failure, product, f'Could not parse page: {e}', response)
+            return
+        self.record(self.batch.add_success, product, response, data)
+
+    def new_batch(self):
+        return ScrapeBatch()
+
+    async def extract(self, product, body):
+        """Parse a fetched page with the product's vendor's extractor."""
+        if self.parse_pool is None:
+            return self.extractors.get(product['vendor_id'], DEFAULT_EXTRACTOR).extract(body)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.parse_pool, parse_workers.extract_page, product['vendor_id'], body
+        )
+
+    def retry_later(self, product, attempt):
+        """Put a product back on the queue after the backoff for its failed attempt."""
+        async def requeue():
+            await asyncio.sleep(retry_delay(attempt))
+            await self.queue.put(product)
+
+        product['attempt'] = attempt + 1
+        task = asyncio.create_task(requeue())
+        self.retries.add(task)
+        task.add_done_callback(self.retries.discard)
+
+    async def fetch(self, session, product):
+        """
+        GET a product page, conditionally if an earlier scrape stored validators.
+
+        A 304 comes back as a FetchedPage with not_modified set and no body.
+        """
+        headers = {}
+        if product['http_etag']:
+            headers['If-None-Match'] = product['http_etag']
+        if product['http_last_modified']:
+            headers['If-Modified-Since'] = product['http_last_modified']
+
+        async with session.get(
+            product['source_url'], headers=headers, trace_request_ctx={'scrape_id': product['scrape_id']},
+        ) as response:
+            if response.status == 304:
+                return FetchedPage(response.status, '', product['http_etag'], product['http_last_modified'])
+            if response.status >= 400:
+                raise ScrapeError(f'HTTP {response.status}', response.status)
+            return FetchedPage(
+                response.status,
+                await response.text(errors='replace'),
+                response.headers.get('ETag', '')[:255],
+                response.headers.get('Last-Modified', '')[:64],
+            )
+
+    async def flush_periodically(self):
+        """
+        Flush whatever is buffered every SCRAPE_FLUSH_SECONDS, so progress is
+        written even while few products complete (or, under the scheduler,
+        while nothing is due).
+        """
+        while True:
+            await asyncio.sleep(settings.SCRAPE_FLUSH_SECONDS)
+            if self.batch.results and (self.flush_task is None or self.flush_task.done()):
+                self.start_flush()
+
+    def record(self, add, *args):
+        """Buffer one outcome and start a flush if the batch is full."""
+        add(*args)
+        if len(self.batch) >= settings.SCRAPE_FLUSH_SIZE:
+            if self.flush_task is None or self.flush_task.done():
+                self.start_flush()
+
+    def start_flush(self):
+        """Hand the buffered outcomes to a background flush; re-raises a failed previous flush."""
+        if self.flush_task is not None:
+            self.flush_task.result()
+
+        stats = self.sessions.stats.copy()
+        stats.subtract(self.saved_stats)
+        self.saved_stats = self.sessions.stats.copy()
+
+        batch, self.batch = self.batch, self.new_batch()
+        self.flush_task = asyncio.create_task(sync_to_async(batch.write)(stats))
+
+    async def flush(self):
+        """Write everything buffered so far and wait for it."""
+        self.start_flush()
+        await self.flush_task
+
+
+class ScrapeBatch:
+    """
+    Buffered scrape outcomes, written together by write().
+
+    One flush is one transaction: a bulk insert of ScrapeResults, one bulk
+    update of Products per outcome kind, one upsert of VendorPrices and a
+    single counter update per Scrape the outcomes belong to.
+
+    A fetched product's siblings get a ScrapeResult of their own in its
+    Scrape, counted in fanned_out_scrapes rather than in the successful and
+    failed counts that add up to total_products.
+
+    With SCRAPE_SKIP_UNCHANGED_RESULTS, results that would repeat the
+    product's stored price, stock and title are counted in
+    unchanged_scrapes instead of written.
+
+    If the database rejects a scraped value (a price or stock too large for
+    its column), the flush is retried with each scraped product written in a
+    savepoint of its own, and the products rejected are recorded as failed.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.scraped = []
+        self.not_modified = []
+        self.failed = []
+        self.prices = {}
+        self.pages = {}
+        self.counters = Counter()
+        # product id -> (scrape_id, counter) of each scraped product
+        self.counted = {}
+
+    def __len__(self):
+        return len(self.results)
+
+    def add_success(self, product, response, data):
+        page_id = self.archive(response)
+        self.add_scraped(product, product['scrape_id'], response, data, page_id, {'parser': data['parser']})
+        self.counters[product['scrape_id'], 'successful_scrapes'] += 1
+        self.fan_out(product, response, data, page_id)
+
+    def add_not_modified(self, product, response):
+        """A 304: the page is unchanged, so the stored price and stock still stand."""
+        now = timezone.now()
+        observe_price(product, product['vendor_price'], now)
+        if settings.SCRAPE_SKIP_UNCHANGED_RESULTS and not product['scrape_error']:
+            self.counters[product['scrape_id'], 'unchanged_scrapes'] += 1
+        else:
+            self.results.append(ScrapeResult(
+                scrape_id=product['scrape_id'],
+                product_id=product['id'],
+                scraped_price=product['vendor_price'],
+                scraped_stock=product['vendor_stock'],
+                scraped_data={'http_status': 304},
+                success=True,
+            ))
+        self.not_modified.append(Product(
+            pk=product['id'],
+            last_scraped=now,
+            next_scrape_at=volatility.next_scrape_time(product, now),
+            price_changes_observed=product['price_changes_observed'],
+            price_hours_observed=product['price_hours_observed'],
+            scrape_error='',
+            updated_at=now,
+        ))
+        self.counters[product['scrape_id'], 'successful_scrapes'] += 1
+        self.counters[product['scrape_id'], 'not_modified_scrapes'] += 1
+        # Unchanged since this product's copy of the page, which its
+        # siblings now get too
+        self.fan_out(product, response, {
+            'price': product['vendor_price'],
+            'stock': product['vendor_stock'],
+            'title': product['title'],
+        }, None)
+
+    def add_failure(self, product, error_message, response=None):
+        """A failed fetch, or (with response) a fetched page that could not be parsed."""
+        page_id = self.archive(response)
+        self.add_failed(product, product['scrape_id'], error_message, page_id, {})
+        for sibling in product.get('siblings', ()):
+            self.add_failed(
+                sibling, product['scrape_id'], error_message, page_id, {'fanned_out_from': product['id']}
+            )
+        self.counters[product['scrape_id'], 'failed_scrapes'] += 1
+        self.counters[product['scrape_id'], 'fanned_out_scrapes'] += len(product.get('siblings', ()))
+
+    def fan_out(self, product, response, data, page_id):
+        """Record a fetched page for the product's siblings (see attach_siblings)."""
+        for sibling in product.get('siblings', ()):
+            self.add_scraped(
+                sibling, product['scrape_id'], response, data, page_id, {'fanned_out_from': product['id']}
+            )
+        self.counters[product['scrape_id'], 'fanned_out_scrapes'] += len(product.get('siblings', ()))
+
+    def add_scraped(self, product, scrape_id, response, data, page_id, details):
+        now = timezone.now()
+        observe_price(product, data['price'], now)
+        # The title is the upload's to set; a scraped one only fills a blank
+        title = product['title'] or data['title'][:500]
+        if settings.SCRAPE_SKIP_UNCHANGED_RESULTS and is_unchanged(product, data['price'], data['stock'], title):
+            self.counters[scrape_id, 'unchanged_scrapes'] += 1
+        else:
+            self.results.append(ScrapeResult(
+                scrape_id=scrape_id,
+                product_id=product['id'],
+                page_id=page_id,
+                scraped_price=data['price'],
+                scraped_stock=data['stock'],
+                scraped_title=data['title'][:500],
+                scraped_data={'http_status': response.status, **details},
+                success=True,
+            ))
+        self.counted[product['id']] = (
+            scrape_id, 'fanned_out_scrapes' if 'fanned_out_from' in details else 'successful_scrapes'
+        )
+        self.scraped.append(Product(
+            pk=product['id'],
+            vendor_id=product['vendor_id'],
+            vendor_sku=product['vendor_sku'],
+            vendor_price=data['price'],
+            vendor_stock=data['stock'],
+            title=title,
+            http_etag=response.etag,
+            http_last_modified=response.last_modified,
+            last_scraped=now,
+            next_scrape_at=volatility.next_scrape_time(product, now),
+            price_changes_observed=product['price_changes_observed'],
+            price_hours_observed=product['price_hours_observed'],
+            scrape_error='',
+            updated_at=now,
+        ))
+        if data['price'] is not None:
+            self.prices[product['vendor_id'], product['vendor_sku']] = data['price']
+
+    def add_failed(self, product, scrape_id, error_message, page_id, details):
+        now = timezone.now()
+        self.results.append(ScrapeResult(
+            scrape_id=scrape_id,
+            product_id=product['id'],
+            page_id=page_id,
+            scraped_data=details,
+            success=False,
+            error_message=error_message,
+        ))
+        self.failed.append(Product(
+            pk=product['id'],
+            next_scrape_at=now + datetime.timedelta(minutes=settings.SCRAPE_RETRY_FAILED_MINUTES),
+            scrape_error=error_message,
+            updated_at=now,
+        ))
+
+    def archive(self, response):
+        """Buffer a fetched page for the archive, if enabled; returns its ArchivedPage key."""
+        if not settings.SCRAPE_ARCHIVE_ENABLED or response is None or not response.body:
+            return None
+        content_hash = page_hash(response.body)
+        self.pages[content_hash] = response.body
+        return content_hash
+
+    def write(self, connection_stats):
+        """
+        Write the batch. connection_stats is a Counter of
+        (scrape_id, statistic) -> connections since the last flush.
+        """
+        try:
+            with transaction.atomic():
+                self.write_all(connection_stats)
+        except DataError:
+            with transaction.atomic():
+                self.write_scraped_each()
+                self.write_all(connection_stats)
+
+    def write_all(self, connection_stats):
+        counters = defaultdict(dict)
+        for (scrape_id, name), delta in (self.counters + connection_stats).items():
+            counters[scrape_id][name] = F(name) + delta
+
+        store_pages(self.pages)
+        ScrapeResult.objects.bulk_create(self.results)
+        update_rows(Product, self.scraped, SCRAPED_PRODUCT_FIELDS)
+        update_rows(Product, self.not_modified, NOT_MODIFIED_PRODUCT_FIELDS)
+        update_rows(Product, self.failed, ['next_scrape_at', 'scrape_error', 'updated_at'])
+        if self.prices:
+            upsert_prices(self.prices)
+        for scrape_id, updates in counters.items():
+            Scrape.objects.filter(pk=scrape_id).update(**updates)
+
+    def write_scraped_each(self):
+        """
+        Write each scraped product, with its results and vendor price, in a
+        savepoint, turning those the database rejects into failures. Leaves
+        the rest of the batch for write_all().
+        """
+        results = defaultdict(list)
+        for result in self.results:
+            if result.success and result.product_id in self.counted:
+                results[result.product_id].append(result)
+        self.results = [result for result in self.results if result.product_id not in results]
+
+        scraped, self.scraped = self.scraped, []
+        written = set()
+        for row in scraped:
+            key = (row.vendor_id, row.vendor_sku)
+            try:
+                with transaction.atomic():
+                    update_rows(Product, [row], SCRAPED_PRODUCT_FIELDS)
+                    ScrapeResult.objects.bulk_create(results[row.pk])
+                    if key in self.prices and key not in written:
+                        upsert_prices({key: self.prices[key]})
+                        written.add(key)
+            except DataError as e:
+                self.prices.pop(key, None)
+                scrape_id, counter = self.counted[row.pk]
+                self.add_failed(
+                    {'id': row.pk}, scrape_id, f'Could not store scraped values: {str(e).splitlines()[0]}',
+                    None, {'price': str(row.vendor_price), 'stock': row.vendor_stock},
+                )
+                if counter == 'successful_scrapes':
+                    self.counters[scrape_id, 'successful_scrapes'] -= 1
+                    self.counters[scrape_id, 'failed_scrapes'] += 1
+        self.prices = {key: price for key, price in self.prices.items() if key not in written}
+
+
+def upsert_prices(prices):
+    """Store {(vendor_id, vendor_sku): price} as the latest VendorPrices."""
+    VendorPrice.objects.bulk_create(
+        [
+            VendorPrice(vendor_id=vendor_id, vendor_sku=vendor_sku, price=price)
+            for (vendor_id, vendor_sku), price in prices.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['vendor', 'vendor_sku'],
+        update_fields=['price', 'last_updated'],
+    )
+
+
+def update_rows(model, rows, fields, batch_size=1000):
+    """
+    model.objects.bulk_update(rows, fields), as one
+    UPDATE ... FROM (VALUES ...) per batch_size rows.
+
+    bulk_update builds a CASE expression with a branch per row for every
+    field, which costs more Python time than the scrape itself once batches
+    hold thousands of rows.
+    """
+    if not rows:
+        return
+    connection = connections[model.objects.db]
+    pk = model._meta.pk
+    columns = [model._meta.get_field(name) for name in fields]
+    row_template = '({})'.format(', '.join(
+        f'%s::{column.db_type(connection)}' for column in [pk, *columns]
+    ))
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f'{quote(column.column)} = v.c{i}' for i, column in enumerate(columns))
+    aliases = ', '.join(f'c{i}' for i in range(len(columns)))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for row in batch:
+                params.append(row.pk)
+                params.extend(column.get_db_prep_save(getattr(row, column.attname), connection) for column in columns)
+            cursor.execute(
+                f'UPDATE {quote(model._meta.db_table)} AS t SET {assignments} '
+                f'FROM (VALUES {", ".join([row_template] * len(batch))}) AS v(pk, {aliases}) '
+                f'WHERE t.{quote(pk.column)} = v.pk',
+                params,
+            )
+
+
+def is_unchanged(product, price, stock, title):
+    """Whether a scraped product's values repeat the ones its last scrape stored."""
+    return (
+        product['last_scraped'] is not None
+        and not product['scrape_error']
+        and price == product['vendor_price']
+        and stock == product['vendor_stock']
+        and title == product['title']
+    )
+
+
+def observe_price(product, price, now):
+    """
+    Fold a scrape at now that found price into the product's volatility
+    totals. The first scrape of a product has nothing to compare against.
+    """
+    if product['last_scraped'] is None or product['vendor_price'] is None:
+        return
+    gap_hours = (now - product['last_scraped']).total_seconds() / 3600
+    product['price_changes_observed'], product['price_hours_observed'] = volatility.observe(
+        product['price_changes_observed'],
+        product['price_hours_observed'],
+        gap_hours,
+        price != product['vendor_price'],
+    )
+
+
+class FetchedPage(NamedTuple):
+    """A fetched product page with the cache validators to store for it."""
+    status: int
+    body: str
+    etag: str
+    last_modified: str
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+def vendor_connection_limits():
+    """{vendor_id: connection limit} for vendors with a scrape_connection_limit set."""
+    return dict(
+        Vendor.objects.filter(scrape_connection_limit__isnull=False)
+        .values_list('id', 'scrape_connection_limit')
+    )
+
+
+class VendorSessions:
+    """
+    One pooled, keep-alive aiohttp session per vendor.
+
+    Vendor sites are a few hosts serving many product URLs, so each vendor
+    gets its own connector: connections are kept alive and reused across its
+    URLs, DNS answers are cached for SCRAPE_DNS_CACHE_SECONDS, and the pool is
+    capped at the vendor's scrape_connection_limit (SCRAPE_VENDOR_CONNECTIONS
+    by default) and at per_host connections to any one host.
+
+    New and reused connections are counted per Scrape, through an aiohttp
+    TraceConfig and the scrape_id each request passes as trace_request_ctx.
+    """
+    STATS = ['connections_opened', 'connections_reused']
+
+    def __init__(self, limits, per_host, timeout):
+        self.limits = limits
+        self.per_host = per_host
+        # No total timeout: time spent waiting for a free pooled connection is
+        # not the vendor's fault, only connecting and reading are bounded.
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        self.sessions = {}
+        self.stats = Counter()
+
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_connection_create_end.append(self.counter('connections_opened'))
+        self.trace_config.on_connection_reuseconn.append(self.counter('connections_reused'))
+
+    def counter(self, name):
+        async def count(session, context, params):
+            self.stats[context.trace_request_ctx['scrape_id'], name] += 1
+        return count
+
+    def get(self, vendor_id):
+        session = self.sessions.get(vendor_id)
+        if session is None:
+            limit = self.limits.get(vendor_id) or settings.SCRAPE_VENDOR_CONNECTIONS
+            connector = aiohttp.TCPConnector(
+                limit=limit,
+                limit_per_host=min(limit, self.per_host),
+                ttl_dns_cache=settings.SCRAPE_DNS_CACHE_SECONDS,
+                keepalive_timeout=settings.SCRAPE_KEEPALIVE_SECONDS,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'User-Agent': settings.SCRAPE_USER_AGENT},
+                trace_configs=[self.trace_config],
+            )
+            self.sessions[vendor_id] = session
+        return session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.gather(*(session.close() for session in self.sessions.values()))
+
+
+def is_host_failure(error):
+    """Whether a failed fetch points at the vendor host rather than the product."""
+    if isinstance(error, ScrapeError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError))
+
+
+def describe_error(error):
+    """Short error_message for a failed fetch; timeouts have no message of their own."""
+    if isinstance(error, asyncio.TimeoutError):
+        return 'Timed out'
+    return str(error) or error.__class__.__name__
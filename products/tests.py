@@ -1,3 +1,391 @@
-from django.test import TestCase
+import asyncio
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import maintenance, progress
+from .extraction import ExtractionError, find_json_ld_product, normalize_number, parse_price
+from .hosts import HostCircuit, HostFailing
+from .scheduler import ScrapeScheduler
+from .uploads import with_violations
+from .validation import validate_rows
+from .volatility import change_rate, observe, scrape_interval_hours
+
+
+@override_settings(
+    SCRAPE_BREAKER_WINDOW=10,
+    SCRAPE_BREAKER_MIN_REQUESTS=4,
+    SCRAPE_BREAKER_FAILURE_RATE=0.5,
+    SCRAPE_BREAKER_OPEN_SECONDS=60,
+)
+class HostCircuitTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('products.hosts.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.circuit = HostCircuit()
+
+    def trip(self):
+        for _ in range(4):
+            self.circuit.record(False, 'HTTP 503')
+        self.assertTrue(self.circuit.is_open)
+
+    def test_closed_circuit_allows_requests(self):
+        self.assertTrue(self.circuit.allow())
+        self.assertFalse(self.circuit.is_open)
+
+    def test_failures_below_min_requests_do_not_trip(self):
+        for _ in range(3):
+            self.circuit.record(False, 'HTTP 503')
+        self.assertFalse(self.circuit.is_open)
+        self.assertTrue(self.circuit.allow())
+
+    def test_failures_below_rate_do_not_trip(self):
+        for ok in [True, True, True, False, True, False]:
+            self.circuit.record(ok, 'HTTP 503')
+        self.assertFalse(self.circuit.is_open)
+
+    def test_trips_at_failure_rate(self):
+        for ok in [True, True, False, False]:
+            self.circuit.record(ok, 'HTTP 503')
+        self.assertTrue(self.circuit.is_open)
+        self.assertEqual(self.circuit.last_error, 'HTTP 503')
+
+    def test_open_circuit_refuses_until_open_seconds_pass(self):
+        self.trip()
+        self.assertFalse(self.circuit.allow())
+        self.now += 59
+        self.assertFalse(self.circuit.allow())
+
+    def test_lets_one_probe_through_after_open_seconds(self):
+        self.trip()
+        self.now += 60
+        self.assertTrue(self.circuit.allow())
+        self.assertFalse(self.circuit.allow())
+
+    def test_successful_probe_closes_circuit(self):
+        self.trip()
+        self.now += 60
+        self.circuit.allow()
+        self.circuit.record(True, probe=True)
+        self.assertFalse(self.circuit.is_open)
+        self.assertFalse(self.circuit.probing)
+        self.assertEqual(len(self.circuit.outcomes), 0)
+        self.assertTrue(self.circuit.allow())
+
+    def test_failed_probe_reopens_circuit(self):
+        self.trip()
+        self.now += 60
+        self.circuit.allow()
+        self.circuit.record(False, 'Timed out', probe=True)
+        self.assertTrue(self.circuit.is_open)
+        self.assertFalse(self.circuit.allow())
+        self.now += 60
+        self.assertTrue(self.circuit.allow())
+
+    def test_late_success_does_not_end_probe(self):
+        self.trip()
+        self.now += 60
+        self.assertTrue(self.circuit.allow())
+        # A request started before the circuit opened completes
+        self.circuit.record(True)
+        self.assertTrue(self.circuit.is_open)
+        self.assertTrue(self.circuit.probing)
+        self.assertFalse(self.circuit.allow())
+
+    def test_late_failure_does_not_allow_second_probe(self):
+        self.trip()
+        self.now += 60
+        self.assertTrue(self.circuit.allow())
+        self.circuit.record(False, 'Timed out')
+        self.now += 60
+        self.assertFalse(self.circuit.allow())
+
+    def test_guard_abandons_fetch_when_circuit_trips(self):
+        async def scenario():
+            fetch_started = asyncio.Event()
+
+            async def fetch():
+                fetch_started.set()
+                await asyncio.sleep(3600)
+
+            guarded = asyncio.ensure_future(self.circuit.guard(fetch()))
+            await fetch_started.wait()
+            self.trip()
+            with self.assertRaises(HostFailing):
+                await guarded
+
+        asyncio.run(scenario())
+
+    def test_guard_returns_fetch_result(self):
+        async def fetch():
+            return 'page'
+
+        self.assertEqual(asyncio.run(self.circuit.guard(fetch())), 'page')
+
+
+class ScrapeSchedulerRefillTests(SimpleTestCase):
+    def product(self, pk):
+        return {'id': pk, 'store_id': 1, 'next_scrape_at': pk, 'siblings': []}
+
+    def take(self, scheduler, count):
+        async def scenario():
+            taken = []
+            async for product in scheduler:
+                taken.append(product['id'])
+                if len(taken) == count:
+                    break
+            return taken
+
+        return asyncio.run(scenario())
+
+    def make_scheduler(self, claims):
+        scheduler = ScrapeScheduler(claim_size=4, idle_seconds=3600)
+        scheduler.complete_finished_scrapes = mock.Mock()
+
+        def claim_due():
+            products = claims.pop(0)
+            scheduler.claimed_full = len(products) == scheduler.claim_size
+            return products
+
+        scheduler.claim_due = mock.Mock(side_effect=claim_due)
+        return scheduler
+
+    def test_refills_at_once_after_full_claim(self):
+        scheduler = self.make_scheduler([
+            [self.product(pk) for pk in range(4)],
+            [self.product(pk) for pk in range(4, 6)],
+        ])
+        self.assertEqual(self.take(scheduler, 4), [0, 1, 2, 3])
+        self.assertEqual(scheduler.claim_due.call_count, 2)
+
+    def test_waits_for_timer_after_partial_claim(self):
+        scheduler = self.make_scheduler([
+            [self.product(pk) for pk in range(3)],
+            [self.product(pk) for pk in range(3, 6)],
+        ])
+        self.assertEqual(self.take(scheduler, 3), [0, 1, 2])
+        self.assertEqual(scheduler.claim_due.call_count, 1)
+
+
+@override_settings(SCRAPE_MAINTENANCE_MINUTES=60)
+class MaintainTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.locked = True
+        for target, kwargs in [
+            ('products.maintenance.time.monotonic', {'side_effect': lambda: self.now}),
+            ('products.maintenance._next_run', {'new': 0}),
+            ('products.maintenance.run_maintenance', {}),
+            ('products.maintenance.connection', {}),
+        ]:
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cursor = maintenance.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = lambda: (self.locked,)
+
+    def test_runs_once_per_interval(self):
+        maintenance.maintain()
+        self.now += 3599
+        maintenance.maintain()
+        self.assertEqual(maintenance.run_maintenance.call_count, 1)
+        self.now += 1
+        maintenance.maintain()
+        self.assertEqual(maintenance.run_maintenance.call_count, 2)
+
+    def test_skips_turn_while_another_process_maintains(self):
+        self.locked = False
+        maintenance.maintain()
+        maintenance.run_maintenance.assert_not_called()
+
+    def test_failure_does_not_propagate(self):
+        maintenance.run_maintenance.side_effect = RuntimeError('boom')
+        with self.assertLogs('products.maintenance', 'ERROR'):
+            maintenance.maintain()
+
+
+class ParsePriceTests(SimpleTestCase):
+    def test_absent(self):
+        for value in [None, '', True, 'call for price']:
+            self.assertIsNone(parse_price(value))
+
+    def test_numbers(self):
+        self.assertEqual(parse_price(19), Decimal('19.00'))
+        self.assertEqual(parse_price(19.5), Decimal('19.50'))
+        self.assertEqual(parse_price(Decimal('7.255')), Decimal('7.26'))
+
+    def test_strings(self):
+        self.assertEqual(parse_price('$1,299.00'), Decimal('1299.00'))
+        self.assertEqual(parse_price('1.299,00 €'), Decimal('1299.00'))
+        self.assertEqual(parse_price('USD 12.5'), Decimal('12.50'))
+
+    def test_out_of_range(self):
+        with self.assertRaises(ExtractionError):
+            parse_price('100,000,000.00')
+        with self.assertRaises(ExtractionError):
+            parse_price(10 ** 8)
+
+
+class NormalizeNumberTests(SimpleTestCase):
+    def test_last_mark_is_decimal(self):
+        self.assertEqual(normalize_number('1,299.00'), '1299.00')
+        self.assertEqual(normalize_number('1.299,00'), '1299.00')
+        self.assertEqual(normalize_number('1.234.567,8'), '1234567.8')
+
+    def test_group_separators(self):
+        self.assertEqual(normalize_number('1 299,00'), '1299.00')
+        self.assertEqual(normalize_number("1'299.00"), '1299.00')
+        self.assertEqual(normalize_number('1 299,00'), '1299.00')
+
+    def test_lone_mark(self):
+        self.assertEqual(normalize_number('12,5'), '12.5')
+        self.assertEqual(normalize_number('12.50'), '12.50')
+        self.assertEqual(normalize_number('0,299'), '0.299')
+
+    def test_lone_mark_before_three_digits_groups_thousands(self):
+        self.assertEqual(normalize_number('1,299'), '1299')
+        self.assertEqual(normalize_number('1.299'), '1299')
+        self.assertEqual(normalize_number('1,299,000'), '1299000')
+
+
+class FindJsonLdProductTests(SimpleTestCase):
+    def test_first_product_block(self):
+        scripts = [
+            '{"@type": "Organization", "name": "Shop"}',
+            '{"@type": "Product", "name": "Lamp"}',
+            '{"@type": "Product", "name": "Other"}',
+        ]
+        self.assertEqual(find_json_ld_product(scripts)['name'], 'Lamp')
+
+    def test_type_list_and_graph(self):
+        scripts = ['{"@graph": [{"@type": "WebPage"}, {"@type": ["Product", "Thing"], "name": "Lamp"}]}']
+        self.assertEqual(find_json_ld_product(scripts)['name'], 'Lamp')
+
+    def test_top_level_list(self):
+        scripts = ['[{"@type": "BreadcrumbList"}, {"@type": "Product", "name": "Lamp"}]']
+        self.assertEqual(find_json_ld_product(scripts)['name'], 'Lamp')
+
+    def test_skips_invalid_json_and_non_objects(self):
+        scripts = ['{not json', '"Product"', '[1, "Product"]', '{"@type": "Product", "name": "Lamp"}']
+        self.assertEqual(find_json_ld_product(scripts)['name'], 'Lamp')
+
+    def test_no_product(self):
+        self.assertIsNone(find_json_ld_product(['{"@type": "Organization"}']))
+        self.assertIsNone(find_json_ld_product([]))
+
+
+@override_settings(UPLOAD_VALIDATION_CHUNK_ROWS=2)
+class ValidateRowsTests(SimpleTestCase):
+    def row(self, vendor_sku='SKU-1', **values):
+        return {'vendor_sku': vendor_sku, 'marketplace_child_sku': 'C-1', 'source_url': '', **values}
+
+    def rejected(self, rows):
+        """{row_num: [(error_type, message)]} of the rows validate_rows() rejects."""
+        rows = list(enumerate(rows, 2))
+        report = validate_rows(rows)
+        return {
+            row_num: violations
+            for row_num, row, violations in with_violations(rows, report)
+            if violations
+        }
+
+    def test_clean_rows(self):
+        report = validate_rows([(2, self.row('A')), (3, self.row('B', source_url='https://localhost/a'))])
+        self.assertEqual(report.total_rows, 2)
+        self.assertEqual(report.rejected_rows, 0)
+
+    def test_missing_vendor_sku(self):
+        self.assertEqual(
+            self.rejected([self.row(''), self.row('  ')]),
+            {2: [('missing_vendor_sku', 'vendor_sku is empty')], 3: [('missing_vendor_sku', 'vendor_sku is empty')]},
+        )
+
+    def test_too_long(self):
+        self.assertEqual(
+            self.rejected([self.row('A', title='x' * 501)]),
+            {2: [('too_long', 'title is 501 characters (max 500)')]},
+        )
+
+    def test_invalid_url(self):
+        rejected = self.rejected([
+            self.row('A', source_url='https://shop.example/p/1?x=1'),
+            self.row('B', source_url='shop.example/p/2'),
+            self.row('C', source_url='https://shop example/p/3'),
+        ])
+        self.assertEqual(list(rejected), [3, 4])
+        self.assertEqual(rejected[3], [('invalid_url', 'invalid source_url: shop.example/p/2')])
+
+    def test_duplicates_keep_first_occurrence(self):
+        rejected = self.rejected([self.row('A'), self.row('B'), self.row('A'), self.row('C'), self.row('A')])
+        self.assertEqual(rejected, {
+            4: [('duplicate_sku', 'duplicate vendor_sku (first seen on row 2)')],
+            6: [('duplicate_sku', 'duplicate vendor_sku (first seen on row 2)')],
+        })
+
+    def test_violations_of_a_row_are_reported_together(self):
+        rejected = self.rejected([self.row('A'), self.row('A', source_url='nope', title='x' * 501)])
+        self.assertEqual([error_type for error_type, _ in rejected[3]], ['too_long', 'invalid_url', 'duplicate_sku'])
+        report = validate_rows([(2, self.row('A')), (3, self.row('A', source_url='nope'))])
+        self.assertEqual(report.rejected_rows, 1)
+
+
+@override_settings(SCRAPE_VOLATILITY_HALF_LIFE_DAYS=1)
+class VolatilityTests(SimpleTestCase):
+    def test_observe_adds_observation(self):
+        self.assertEqual(observe(0, 0, 12, True), (1, 12))
+        self.assertEqual(observe(0, 0, 12, False), (0, 12))
+
+    def test_observe_decays_earlier_totals(self):
+        changes, hours = observe(4, 100, 24, True)
+        self.assertAlmostEqual(changes, 4 * 0.5 + 1)
+        self.assertAlmostEqual(hours, 100 * 0.5 + 24)
+
+    def test_change_rate_without_observations_is_one_per_interval(self):
+        self.assertEqual(change_rate(0, 0, 24), 1 / 24)
+
+    def test_change_rate_follows_observations(self):
+        self.assertEqual(change_rate(9, 216, 24), 10 / 240)
+        self.assertLess(change_rate(0, 1000, 24), change_rate(20, 1000, 24))
+
+    def test_fixed_interval_without_bounds(self):
+        self.assertEqual(scrape_interval_hours(50, 10, 24), 24)
+
+    def test_no_observations_keep_store_interval(self):
+        self.assertAlmostEqual(scrape_interval_hours(0, 0, 24, 1, 168), 24)
+
+    def test_scales_with_square_root_of_rate(self):
+        # Four times the reference rate: twice as often
+        self.assertAlmostEqual(scrape_interval_hours(3, 0, 24, 1, 168, reference_rate=1 / 24), 12)
+        self.assertAlmostEqual(scrape_interval_hours(3, 0, 24, 1, 168, reference_rate=1 / 96), 6)
+        self.assertAlmostEqual(scrape_interval_hours(0, 72, 24, 1, 168), 48)
+
+    def test_clamped_to_bounds(self):
+        self.assertEqual(scrape_interval_hours(1000, 0, 24, 6, 48), 6)
+        self.assertEqual(scrape_interval_hours(0, 100000, 24, 6, 48), 48)
+
+    def test_unset_bound_is_store_interval(self):
+        self.assertEqual(scrape_interval_hours(1000, 0, 24, None, 48), 24)
+        self.assertEqual(scrape_interval_hours(0, 100000, 24, 6, None), 24)
+
+
+@override_settings(SCRAPE_PROGRESS_STREAM_SECONDS=60, SCRAPE_FLUSH_SECONDS=2)
+class ProgressEventsTests(SimpleTestCase):
+    def scrape(self, status, done):
+        return {
+            'status': status, 'total_products': 10, 'successful_scrapes': done, 'failed_scrapes': 0,
+            'not_modified_scrapes': 0, 'fanned_out_scrapes': 0, 'started_at': None, 'completed_at': None,
+        }
+
+    def test_closes_connection_between_polls(self):
+        reads = [self.scrape('running', 1), self.scrape('running', 5), self.scrape('completed', 10)]
+        with mock.patch('products.progress.read_scrape', side_effect=reads), \
+                mock.patch('products.progress.time.sleep') as sleep, \
+                mock.patch('products.progress.connection') as connection:
+            messages = list(progress.events(1))
+        self.assertEqual(len(messages), 3)
+        self.assertIn('event: complete', messages[-1])
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(connection.close.call_count, 2)
@@ -0,0 +1,21 @@
+"""
+Process-pool entry points for parallel upload ingestion.
+
+Workers are started with the spawn method, so this module must stay importable
+before Django is set up: models are only imported inside the functions.
+"""
+import django
+
+
+def init_worker():
+    """Set up Django in a freshly spawned worker process."""
+    django.setup()
+
+
+def ingest_partition(upload_id, partition, path, batch_size=None):
+    """Ingest one partition file for an upload and return its IngestResult."""
+    from .models import Upload
+    from .uploads import ingest_partition as ingest
+
+    upload = Upload.objects.select_related('vendor', 'store__marketplace').get(pk=upload_id)
+    return ingest(upload, partition, path, batch_size=batch_size)
@@ -0,0 +1,747 @@
+"""
+Batch ingestion pipeline for product uploads.
+
+Rows parsed from an upload file are collected into batches and written with a
+single multi-row upsert (INSERT ... ON CONFLICT DO UPDATE) keyed on the
+Product unique constraint, instead of one SELECT plus INSERT/UPDATE per row.
+Each row carries a fingerprint of its uploaded fields, stored on the Product
+as content_hash; rows whose fingerprint matches the stored one are skipped
+entirely.
+
+Files are never read into memory whole: the upload is stored on disk at
+Upload.file_path, CSV files are streamed from there through an incremental
+decoder, and Excel workbooks are read with openpyxl's read-only row iterator,
+so memory use is bounded by the batch size rather than the file size.
+
+Every batch commits an UploadCheckpoint together with its rows, counters and
+rejected-row UploadErrors. If processing is interrupted, resuming re-reads the
+stored file and skips everything at or below the checkpoint instead of
+starting over.
+"""
+import contextlib
+import csv
+import datetime
+import hashlib
+import io
+import os
+import re
+import tempfile
+import zlib
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Product, Upload, UploadCheckpoint, UploadError
+from .validation import validate_rows
+
+
+# Columns read from each upload row, in the order they map onto Product.
+UPLOAD_COLUMNS = [
+    'vendor_sku',
+    'marketplace_child_sku',
+    'marketplace_parent_sku',
+    'title',
+    'source_url',
+]
+
+# Accepted header spellings for each upload column, after normalize_header().
+COLUMN_ALIASES = {
+    'vendor_sku': ['vendor_sku', 'sku', 'item_number', 'vendor_item_number', 'vendor_item'],
+    'marketplace_child_sku': ['marketplace_child_sku', 'child_sku', 'marketplace_sku'],
+    'marketplace_parent_sku': ['marketplace_parent_sku', 'parent_sku'],
+    'title': ['title', 'product_title', 'name', 'product_name'],
+    'source_url': ['source_url', 'url', 'product_url', 'link'],
+}
+
+HEADER_TO_COLUMN = {
+    alias: column
+    for column, aliases in COLUMN_ALIASES.items()
+    for alias in aliases
+}
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Product unique_together key used as the ON CONFLICT target.
+PRODUCT_UNIQUE_FIELDS = ['vendor', 'vendor_sku', 'store']
+
+# Fields overwritten when an uploaded row matches an existing product.
+PRODUCT_UPDATE_FIELDS = [
+    'marketplace',
+    'marketplace_child_sku',
+    'marketplace_parent_sku',
+    'title',
+    'source_url',
+    'upload',
+    'content_hash',
+    'updated_at',
+]
+
+
+def store_upload_file(upload, file):
+    """
+    Save an UploadedFile durably and record its location on the Upload.
+
+    The file is written chunk by chunk (or moved, if Django already spooled it
+    to a temporary file), so it is never held in memory.
+    """
+    name = os.path.join(settings.UPLOAD_FILES_DIR, f'{upload.id}-{os.path.basename(file.name)}')
+    upload.file_path = default_storage.save(name, file)
+    upload.save(update_fields=['file_path', 'updated_at'])
+
+
+def hash_upload_file(file):
+    """SHA-256 of an UploadedFile's content, read chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def find_matching_upload(vendor, store, content_hash):
+    """
+    Most recent upload of identical content for the same vendor and store.
+
+    Failed uploads are ignored so that a retry after a failure runs again.
+    """
+    return (
+        Upload.objects.filter(vendor=vendor, store=store, content_hash=content_hash)
+        .exclude(status='failed')
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def process_upload(upload):
+    """
+    Ingest an upload's stored file from its checkpoints and mark it completed.
+
+    Row counters are read back from the database, since a resumed run only
+    sees the rows after the checkpoint. The stored file is removed once the
+    upload completes.
+
+    Runs under the (vendor, store) upload lock, so it waits in the queued
+    status while another upload for the same vendor and store is processing.
+    If a resume completed the upload meanwhile, there is nothing left to do.
+    """
+    with upload_scope_lock(upload):
+        upload.refresh_from_db(fields=['status', 'file_path'])
+        if upload.status == 'completed' or not upload.file_path:
+            return upload
+        return run_upload(upload)
+
+
+def process_resumed_upload(upload):
+    """
+    Resume an interrupted upload from its checkpoints, as process_upload().
+
+    Whether the upload's run is still alive is decided by the (vendor, store)
+    upload lock rather than by how recently it made progress: a run holds the
+    lock for as long as its process lives. If the lock is taken, raises
+    UploadInProgress. Otherwise no upload of the scope is being processed,
+    so a failed upload, or one left queued or processing by a process that
+    died, is claimed and run. Returns False if the upload cannot be resumed.
+    """
+    with upload_scope_lock(upload, wait=False):
+        if not claim_for_resume(upload):
+            return False
+        upload.refresh_from_db()
+        run_upload(upload)
+    return True
+
+
+def run_upload(upload):
+    """Ingest the stored file of an upload whose scope lock is held."""
+    upload.status = 'processing'
+    upload.started_at = upload.started_at or timezone.now()
+    upload.save(update_fields=['status', 'started_at', 'updated_at'])
+
+    with default_storage.open(upload.file_path, 'rb') as stream:
+        if upload.workers > 1:
+            ingest_upload_parallel(upload, stream, upload.workers)
+        else:
+            ingest_upload(upload, stream)
+
+    upload.refresh_from_db(fields=[
+        'processed_rows', 'successful_rows', 'failed_rows',
+        'new_rows', 'changed_rows', 'unchanged_rows',
+    ])
+
+    file_path = upload.file_path
+    upload.file_path = ''
+    upload.status = 'completed'
+    upload.total_rows = upload.processed_rows
+    upload.error_details = summarize_errors(upload)
+    upload.completed_at = timezone.now()
+    upload.save()
+
+    default_storage.delete(file_path)
+    return upload
+
+
+def upload_lock_key(upload):
+    """Signed 64-bit advisory lock key for an upload's (vendor, store) scope."""
+    digest = hashlib.blake2b(f'upload:{upload.vendor_id}:{upload.store_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class UploadInProgress(Exception):
+    """Another upload for the same vendor and store is being processed."""
+
+
+@contextlib.contextmanager
+def upload_scope_lock(upload, wait=True):
+    """
+    Hold a Postgres advisory lock on the upload's vendor and store for the block.
+
+    Uploads for the same vendor and store would otherwise race on the Product
+    unique constraint; uploads for other scopes take different locks and are
+    not held up. If the lock is taken, the upload is marked queued and the
+    call blocks until it is released, or with wait=False raises
+    UploadInProgress.
+
+    The lock is transaction-scoped and held on a dedicated connection with a
+    transaction left open, so it works through the Supabase transaction
+    pooler, survives the parallel path closing the request's connections and
+    is dropped by the server if this process dies.
+    """
+    key = upload_lock_key(upload)
+    lock_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        lock_connection.set_autocommit(False)
+        with lock_connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [key])
+            if not cursor.fetchone()[0]:
+                if not wait:
+                    raise UploadInProgress(
+                        f'An upload for vendor {upload.vendor_id} and store {upload.store_id} is being processed'
+                    )
+                upload.status = 'queued'
+                upload.save(update_fields=['status', 'updated_at'])
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+        yield
+    finally:
+        try:
+            lock_connection.rollback()
+        finally:
+            lock_connection.close()
+
+
+def summarize_errors(upload):
+    """
+    Build the capped Upload.error_details summary from the upload's UploadErrors.
+
+    Holds the first UPLOAD_ERROR_SAMPLE_SIZE messages (in row order) under
+    'errors', plus per-type counts; the full list is served by the upload
+    errors endpoint.
+    """
+    row_errors = UploadError.objects.filter(upload=upload)
+    counts_by_type = dict(
+        row_errors.order_by().values_list('error_type').annotate(count=Count('id'))
+    )
+    if not counts_by_type:
+        return {}
+
+    sample = [
+        f"Row {row_number}: {message}"
+        for row_number, message in row_errors.order_by('row_number').values_list(
+            'row_number', 'message'
+        )[:settings.UPLOAD_ERROR_SAMPLE_SIZE]
+    ]
+    total = sum(counts_by_type.values())
+    return {
+        'errors': sample,
+        'counts_by_type': counts_by_type,
+        'total': total,
+        'truncated': total > len(sample),
+    }
+
+
+def error_type_of(error):
+    """Short snake_case label for an exception, e.g. DataError -> data_error."""
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', type(error).__name__).lower()
+
+
+def mark_upload_failed(upload, error):
+    """Record a failed upload, keeping the counters committed batches recorded."""
+    upload.status = 'failed'
+    upload.error_message = str(error)
+    upload.completed_at = timezone.now()
+    Upload.objects.filter(pk=upload.pk).exclude(status='completed').update(
+        status=upload.status,
+        error_message=upload.error_message,
+        completed_at=upload.completed_at,
+        updated_at=timezone.now(),
+    )
+
+
+def claim_for_resume(upload):
+    """
+    Mark an interrupted upload as processing again; call with its scope lock held.
+
+    With the lock held no upload of the scope is being processed, so one
+    still marked queued or processing was left so by a process that died.
+    Returns False if the upload has completed or its file is gone.
+    """
+    claimed = Upload.objects.filter(pk=upload.pk, status__in=['failed', 'queued', 'processing']).exclude(
+        file_path=''
+    ).update(status='processing', error_message='', completed_at=None, updated_at=timezone.now())
+    return bool(claimed)
+
+
+def normalize_header(header):
+    """Reduce a column header to lower_snake_case ("Vendor SKU" -> "vendor_sku")."""
+    return re.sub(r'[^a-z0-9]+', '_', str(header or '').strip().lower()).strip('_')
+
+
+def map_headers(headers):
+    """
+    Map file headers onto upload columns.
+
+    Returns a list parallel to headers holding the upload column for each
+    position, or None for columns that are not imported. When two headers map
+    to the same column the first one wins.
+    """
+    mapping = []
+    seen = set()
+    for header in headers:
+        column = HEADER_TO_COLUMN.get(normalize_header(header))
+        if column in seen:
+            column = None
+        if column:
+            seen.add(column)
+        mapping.append(column)
+
+    if 'vendor_sku' not in seen:
+        raise ValueError("Upload file has no vendor_sku column")
+    return mapping
+
+
+def iter_upload_rows(stream, filename):
+    """Yield (row_num, row) pairs from an upload, choosing the parser by extension."""
+    if os.path.splitext(filename or '')[1].lower() in EXCEL_EXTENSIONS:
+        return iter_xlsx_rows(stream)
+    return iter_csv_rows(stream)
+
+
+def iter_csv_rows(stream):
+    """Yield (row_num, row) pairs from a binary CSV stream, decoding lazily."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        mapping = map_headers(next(reader, []))
+        for row_num, values in enumerate(reader, start=2):
+            if values:
+                yield row_num, build_row(mapping, values)
+    finally:
+        # Leave the underlying stream open for the caller to close.
+        text.detach()
+
+
+def iter_xlsx_rows(stream):
+    """
+    Yield (row_num, row) pairs from the first sheet of an .xlsx workbook.
+
+    The workbook is opened in read-only mode, which streams rows from the
+    sheet XML instead of building the whole workbook in memory.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        mapping = map_headers(next(rows, ()))
+        for row_num, values in enumerate(rows, start=2):
+            if any(value is not None for value in values):
+                yield row_num, build_row(mapping, [cell_to_str(value) for value in values])
+    finally:
+        workbook.close()
+
+
+def build_row(mapping, values):
+    return {column: value for column, value in zip(mapping, values) if column}
+
+
+def cell_to_str(value):
+    """Render an Excel cell value the way it would appear in a CSV export."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Numeric SKUs come back as floats (12345.0).
+        return str(int(value))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def ingest_upload(upload, stream, batch_size=None):
+    """
+    Stream a CSV or Excel upload into Product through a ProductUploadWriter.
+
+    The file is validated in full first; rows with violations are recorded
+    as errors and only clean rows are written.
+    """
+    report = prevalidate(upload, stream)
+
+    writer = ProductUploadWriter(upload, batch_size=batch_size)
+    for row_num, row, violations in with_violations(iter_upload_rows(stream, upload.filename), report):
+        if violations:
+            writer.reject(row_num, violations)
+        else:
+            writer.add(row_num, row)
+    writer.finish()
+    return writer.result
+
+
+def prevalidate(upload, stream):
+    """
+    Run the columnar validation pass over the whole file, then rewind it.
+
+    The row count is known after this pass, so Upload.total_rows is set
+    before ingestion starts and processed_rows can be shown as a percentage.
+    """
+    report = validate_rows(iter_upload_rows(stream, upload.filename))
+    stream.seek(0)
+
+    upload.total_rows = report.total_rows
+    Upload.objects.filter(pk=upload.pk).update(total_rows=report.total_rows)
+    return report
+
+
+def with_violations(rows, report):
+    """Pair each (row_num, row) with its violations; both are in ascending row order."""
+    violations = report.iter_by_row()
+    pending = next(violations, None)
+    for row_num, row in rows:
+        found = []
+        while pending is not None and pending[0] <= row_num:
+            if pending[0] == row_num:
+                found = report.describe(row, pending[1])
+            pending = next(violations, None)
+        yield row_num, row, found
+
+
+def ingest_upload_parallel(upload, stream, workers, batch_size=None):
+    """
+    Ingest an upload with a pool of worker processes.
+
+    Rows are split into one partition file per worker by a stable hash of
+    vendor_sku, so each (vendor, vendor_sku, store) key is only ever written
+    by one worker and partitions never contend on the same unique key. Each
+    worker adds its counters to the shared Upload row as its batches commit
+    and keeps its own checkpoint. Partitioning is deterministic, so a resumed
+    upload with the same worker count rebuilds identical partitions.
+
+    Validation runs once over the whole file in this process; rejected rows
+    are recorded here (as one extra partition) and never sent to a worker.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from . import upload_workers
+
+    report = prevalidate(upload, stream)
+    rejects = ProductUploadWriter(upload, partition=workers)
+
+    result = IngestResult()
+    with tempfile.TemporaryDirectory(prefix='upload-') as tmpdir:
+        paths = partition_rows(
+            with_violations(iter_upload_rows(stream, upload.filename), report),
+            workers, tmpdir, rejects,
+        )
+        rejects.finish()
+        result.merge(rejects.result)
+
+        # Workers open their own connections; don't hand them ours.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=upload_workers.init_worker,
+        ) as pool:
+            futures = [
+                pool.submit(upload_workers.ingest_partition, upload.pk, partition, path, batch_size)
+                for partition, path in enumerate(paths)
+            ]
+            for future in futures:
+                result.merge(future.result())
+
+    return result
+
+
+def partition_key(vendor_sku, partitions):
+    """Stable partition index for a SKU (hash() is randomized per process)."""
+    return zlib.crc32(vendor_sku.encode('utf-8')) % partitions
+
+
+def partition_rows(rows, partitions, directory, rejects):
+    """
+    Write clean (row_num, row, violations) rows into one CSV file per
+    partition and hand rejected rows to the rejects writer; return the paths.
+    """
+    paths = [os.path.join(directory, f'partition-{i}.csv') for i in range(partitions)]
+    files = [open(path, 'w', newline='', encoding='utf-8') for path in paths]
+    try:
+        writers = [csv.writer(f) for f in files]
+        for row_num, row, violations in rows:
+            if violations:
+                rejects.reject(row_num, violations)
+                continue
+            values = clean_row(row)
+            writers[partition_key(values['vendor_sku'], partitions)].writerow(
+                [row_num] + [values[column] for column in UPLOAD_COLUMNS]
+            )
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def iter_partition_rows(path):
+    """Yield (row_num, row) pairs back out of a partition file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for values in csv.reader(f):
+            yield int(values[0]), dict(zip(UPLOAD_COLUMNS, values[1:]))
+
+
+def ingest_partition(upload, partition, path, batch_size=None):
+    """Ingest one partition file written by partition_rows()."""
+    writer = ProductUploadWriter(upload, batch_size=batch_size, partition=partition)
+    for row_num, row in iter_partition_rows(path):
+        writer.add(row_num, row)
+    writer.finish()
+    return writer.result
+
+
+def clean_row(row):
+    """Normalize a raw upload row into stripped strings for UPLOAD_COLUMNS."""
+    return {column: (row.get(column) or '').strip() for column in UPLOAD_COLUMNS}
+
+
+def fingerprint(values, marketplace_id):
+    """Hash the fields an upload writes, to compare a row with its stored product."""
+    parts = [str(marketplace_id)] + [values[column] for column in UPLOAD_COLUMNS]
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class IngestResult:
+    """Row counters for an ingestion run or partition."""
+
+    COUNTERS = ('successful_rows', 'failed_rows', 'new_rows', 'changed_rows', 'unchanged_rows')
+
+    def __init__(self):
+        self.successful_rows = 0
+        self.failed_rows = 0
+        # Breakdown of successful_rows by change detection
+        self.new_rows = 0
+        self.changed_rows = 0
+        self.unchanged_rows = 0
+
+    @property
+    def total_rows(self):
+        return self.successful_rows + self.failed_rows
+
+    def counters(self):
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def merge(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class ProductUploadWriter:
+    """
+    Buffers upload rows and writes them to Product in batches.
+
+    Each batch is one upsert inside its own transaction. If the database
+    rejects a batch, its rows are retried one at a time under savepoints so
+    that only the offending rows are reported as failed. Upload progress
+    counters are incremented in the same transaction as each batch, so
+    several writers can report into one Upload.
+
+    Before writing, the stored fingerprints of the batch's SKUs are read in
+    one query; rows that match are counted as unchanged and not written, so re-uploading an identical catalog leaves Product (and
+    updated_at) alone.
+
+    Rows must be fed in ascending row order. Each flush moves the partition's
+    UploadCheckpoint to the last row fed, and rows at or below the checkpoint
+    a writer starts from are skipped. Rejected rows are buffered as
+    UploadError objects and inserted with the batch.
+    """
+
+    def __init__(self, upload, batch_size=None, partition=0):
+        self.upload = upload
+        self.vendor = upload.vendor
+        self.store = upload.store
+        self.batch_size = batch_size or settings.UPLOAD_BATCH_SIZE
+
+        self.checkpoint, _ = UploadCheckpoint.objects.get_or_create(
+            upload=upload, partition=partition
+        )
+        self.resume_after = self.checkpoint.last_row
+        self._last_row = self.resume_after
+
+        self.result = IngestResult()
+        self._saved = self.result.counters()
+        self._batch = []
+        self._errors = []
+
+    def add(self, row_num, row):
+        """Queue a parsed row, flushing when the batch is full."""
+        if row_num <= self.resume_after:
+            return
+        self._last_row = row_num
+
+        try:
+            product = self.build_product(clean_row(row))
+        except Exception as e:
+            self.record_error(row_num, e)
+            return
+
+        self._batch.append((row_num, product))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def build_product(self, values):
+        """Build an unsaved Product for a cleaned row."""
+        return Product(
+            vendor=self.vendor,
+            store=self.store,
+            marketplace=self.store.marketplace,
+            upload=self.upload,
+            content_hash=fingerprint(values, self.store.marketplace_id),
+            **values
+        )
+
+    def reject(self, row_num, violations):
+        """Count a row as failed without writing it; violations is [(error_type, message)]."""
+        if row_num <= self.resume_after:
+            return
+        self._last_row = row_num
+
+        self.result.failed_rows += 1
+        self._errors.extend(
+            UploadError(upload=self.upload, row_number=row_num, error_type=error_type, message=message)
+            for error_type, message in violations
+        )
+        if len(self._errors) >= self.batch_size:
+            self.flush()
+
+    def record_error(self, row_num, error):
+        self.result.failed_rows += 1
+        self._errors.append(UploadError(
+            upload=self.upload,
+            row_number=row_num,
+            error_type=error_type_of(error),
+            message=str(error).strip(),
+        ))
+
+    def flush(self):
+        """Write the buffered batch and advance the checkpoint past it."""
+        batch, self._batch = self._batch, []
+        if self._last_row == self.checkpoint.last_row:
+            return
+
+        with transaction.atomic():
+            existing = self._stored_fingerprints(batch)
+            pending = [
+                (row_num, product)
+                for row_num, product in self._dedupe(batch)
+                if existing.get(product.vendor_sku) != product.content_hash
+            ]
+
+            failed = set()
+            if pending:
+                try:
+                    with transaction.atomic():
+                        self._upsert([product for _, product in pending])
+                except DatabaseError:
+                    failed = self._write_rows_individually(pending)
+
+            for row_num, product in batch:
+                if row_num not in failed:
+                    self._record_success(product, existing)
+            self.save_progress()
+
+    def finish(self):
+        """Flush any remaining rows."""
+        self.flush()
+
+    def save_progress(self):
+        """
+        Add the counters accumulated since the last save to the Upload row,
+        store buffered row errors and move the checkpoint. Called inside the
+        batch transaction, so all of it commits (or rolls back) together with
+        the batch's rows.
+        """
+        if self._errors:
+            UploadError.objects.bulk_create(self._errors)
+            self._errors = []
+
+        counters = self.result.counters()
+        delta = {name: counters[name] - self._saved[name] for name in counters}
+
+        Upload.objects.filter(pk=self.upload.pk).update(
+            processed_rows=F('processed_rows') + delta['successful_rows'] + delta['failed_rows'],
+            updated_at=timezone.now(),
+            **{name: F(name) + value for name, value in delta.items()}
+        )
+        UploadCheckpoint.objects.filter(pk=self.checkpoint.pk).update(
+            last_row=self._last_row, updated_at=timezone.now()
+        )
+        self.checkpoint.last_row = self._last_row
+        self._saved = counters
+
+    def _stored_fingerprints(self, batch):
+        """
+        Map vendor_sku -> content_hash of the products in the batch that
+        already exist: the fingerprint of the row they were last uploaded
+        from. Scraping leaves the uploaded fields alone, so it still
+        describes them.
+        """
+        skus = {product.vendor_sku for _, product in batch}
+        return dict(
+            Product.objects.filter(vendor=self.vendor, store=self.store, vendor_sku__in=skus)
+            .values_list('vendor_sku', 'content_hash')
+        )
+
+    def _record_success(self, product, existing):
+        self.result.successful_rows += 1
+        if product.vendor_sku not in existing:
+            self.result.new_rows += 1
+        elif existing[product.vendor_sku] == product.content_hash:
+            self.result.unchanged_rows += 1
+        else:
+            self.result.changed_rows += 1
+
+    def _upsert(self, products):
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=PRODUCT_UNIQUE_FIELDS,
+            update_fields=PRODUCT_UPDATE_FIELDS,
+        )
+
+    def _dedupe(self, batch):
+        """
+        Keep only the last occurrence of each SKU in a batch.
+
+        Postgres refuses to update the same row twice in one ON CONFLICT
+        statement; the last row wins, as it did with sequential upserts.
+        """
+        latest = {}
+        for row_num, product in batch:
+            latest[product.vendor_sku] = (row_num, product)
+        return sorted(latest.values(), key=lambda item: item[0])
+
+    def _write_rows_individually(self, batch):
+        """Write rows one savepoint at a time; return the row numbers that failed."""
+        failed = set()
+        for row_num, product in batch:
+            try:
+                with transaction.atomic():
+                    self._upsert([product])
+            except DatabaseError as e:
+                self.record_error(row_num, e)
+                failed.add(row_num)
+        return failed
@@ -0,0 +1,165 @@
+"""
+Columnar pre-validation of upload files using pandas.
+
+The whole file is checked before anything is written: rows are loaded into
+DataFrames a chunk at a time and every rule runs as a vectorized column
+operation, so a multi-million-row file is validated in seconds and every
+violation is reported in one pass. Each violation is held as a few integers
+until its row is rejected, so even a file that is mostly bad rows is
+validated in bounded memory. Rows with violations never reach the database
+writer.
+"""
+import itertools
+import re
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .models import Product
+
+
+URL_PATTERN = re.compile(r'^https?://[^\s/?#]+(?:[/?#]\S*)?$')
+
+# Violation codes. Only (row_num, code, detail) integers are kept per
+# violation; messages are built from the row itself when it is rejected
+# (see ValidationReport.describe). A too-long value's code is TOO_LONG plus
+# the column's index in UPLOAD_COLUMNS.
+MISSING_SKU = 0
+INVALID_URL = 1
+DUPLICATE_SKU = 2
+TOO_LONG = 3
+
+
+class ValidationReport:
+    """
+    Violations found in an upload file.
+
+    row_nums, codes and details are parallel integer arrays sorted by
+    row_num; a row may appear more than once if it breaks several rules.
+    details is the first row of the SKU for DUPLICATE_SKU and 0 otherwise.
+    """
+
+    def __init__(self, row_nums, codes, details, total_rows, columns):
+        self.row_nums = row_nums
+        self.codes = codes
+        self.details = details
+        self.total_rows = total_rows
+        self.columns = columns
+
+    @property
+    def rejected_rows(self):
+        return len(np.unique(self.row_nums))
+
+    def iter_by_row(self):
+        """Yield (row_num, [(code, detail), ...]) in ascending row order."""
+        rows = zip(self.row_nums.tolist(), self.codes.tolist(), self.details.tolist())
+        for row_num, group in itertools.groupby(rows, key=lambda violation: violation[0]):
+            yield row_num, [(code, detail) for _, code, detail in group]
+
+    def describe(self, row, violations):
+        """[(error_type, message)] for a row's [(code, detail)] from iter_by_row()."""
+        described = []
+        for code, detail in violations:
+            if code == MISSING_SKU:
+                described.append(('missing_vendor_sku', 'vendor_sku is empty'))
+            elif code == INVALID_URL:
+                url = (row.get('source_url') or '').strip()
+                described.append(('invalid_url', f'invalid source_url: {url[:200]}'))
+            elif code == DUPLICATE_SKU:
+                described.append(('duplicate_sku', f'duplicate vendor_sku (first seen on row {detail})'))
+            else:
+                column = self.columns[code - TOO_LONG]
+                max_length = Product._meta.get_field(column).max_length
+                length = len((row.get(column) or '').strip())
+                described.append(('too_long', f'{column} is {length} characters (max {max_length})'))
+        return described
+
+
+def validate_rows(rows, chunk_rows=None):
+    """
+    Validate (row_num, row) pairs from iter_upload_rows().
+
+    Checks for a missing vendor_sku, values longer than the Product field's
+    max_length, malformed source_url values and vendor_sku values repeated
+    within the file (every occurrence after the first is rejected).
+    """
+    from .uploads import UPLOAD_COLUMNS
+
+    chunk_rows = chunk_rows or settings.UPLOAD_VALIDATION_CHUNK_ROWS
+    row_nums = []
+    codes = []
+    sku_hashes = []
+    sku_rows = []
+    total_rows = 0
+
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            break
+        total_rows += len(chunk)
+
+        df = pd.DataFrame(
+            {'row_num': np.fromiter((row_num for row_num, _ in chunk), dtype=np.int64, count=len(chunk))}
+        )
+        for column in UPLOAD_COLUMNS:
+            # Plain object columns: converting to pandas' string dtype costs
+            # more than every check below combined.
+            df[column] = pd.array([(row.get(column) or '').strip() for _, row in chunk], dtype=object)
+
+        for found, code in check_chunk(df, UPLOAD_COLUMNS):
+            row_nums.append(found)
+            codes.append(np.full(len(found), code, dtype=np.int16))
+
+        # Keep only a 64-bit hash per SKU for the file-wide duplicate check.
+        present = df[df['vendor_sku'] != '']
+        sku_hashes.append(pd.util.hash_pandas_object(present['vendor_sku'], index=False).to_numpy())
+        sku_rows.append(present['row_num'].to_numpy())
+
+    details = [np.zeros(len(found), dtype=np.int64) for found in row_nums]
+    if sku_hashes:
+        duplicates = find_duplicates(np.concatenate(sku_hashes), np.concatenate(sku_rows))
+        if duplicates is not None:
+            row_nums.append(duplicates[0])
+            codes.append(np.full(len(duplicates[0]), DUPLICATE_SKU, dtype=np.int16))
+            details.append(duplicates[1])
+
+    if row_nums:
+        row_nums, codes, details = np.concatenate(row_nums), np.concatenate(codes), np.concatenate(details)
+        order = np.argsort(row_nums, kind='stable')
+        row_nums, codes, details = row_nums[order], codes[order], details[order]
+    else:
+        row_nums = details = np.empty(0, dtype=np.int64)
+        codes = np.empty(0, dtype=np.int16)
+    return ValidationReport(row_nums, codes, details, total_rows, UPLOAD_COLUMNS)
+
+
+def check_chunk(df, columns):
+    """Run the per-row rules over one chunk; return [(row_nums, code)] of the rules broken."""
+    found = [(df['vendor_sku'] == '', MISSING_SKU)]
+
+    for index, column in enumerate(columns):
+        max_length = Product._meta.get_field(column).max_length
+        # len() over the raw objects is several times faster than .str.len().
+        lengths = np.fromiter(map(len, df[column].to_numpy()), dtype=np.int64, count=len(df))
+        found.append((lengths > max_length, TOO_LONG + index))
+
+    urls = df['source_url'].to_numpy()
+    matches = np.fromiter(map(bool, map(URL_PATTERN.match, urls)), dtype=bool, count=len(df))
+    found.append(((urls != '') & ~matches, INVALID_URL))
+
+    row_nums = df['row_num'].to_numpy()
+    return [(row_nums[np.asarray(mask)], code) for mask, code in found if np.any(mask)]
+
+
+def find_duplicates(hashes, row_nums):
+    """
+    (row_nums, first_rows) of every occurrence of a SKU hash after its
+    first, with the row of that first occurrence; None if there are none.
+    """
+    hashes = pd.Series(hashes)
+    duplicated = hashes.duplicated(keep='first').to_numpy()
+    if not duplicated.any():
+        return None
+
+    first_rows = pd.Series(row_nums).groupby(hashes).transform('first').to_numpy()
+    return row_nums[duplicated], first_rows[duplicated]
@@ -0,0 +1,105 @@
+"""
+Per-product price change rate estimates and the scrape intervals they imply.
+
+Each successful scrape (including a 304) observes whether a product's price
+changed since the previous successful scrape, over the hours between them.
+A product keeps exponentially decayed totals of both, price_changes_observed
+and price_hours_observed, with a half-life of
+SCRAPE_VOLATILITY_HALF_LIFE_DAYS so the estimate follows recent behaviour.
+
+The change rate is estimated as
+
+    (changes + 1) / (hours + store interval)
+
+i.e. as if one change per store scraping interval had already been seen,
+so products with little history start out at the store's interval and move
+away from it as evidence accumulates.
+
+The next interval scales the store's interval by sqrt(reference rate /
+estimated rate): a product changing four times as often as the reference is
+scraped twice as often, one changing a quarter as often half as often. The
+square root spends the fetches saved on stable products on volatile ones
+without letting a few very volatile products take the whole budget. The
+reference rate is the squared mean of sqrt(rate) over the store's products
+(Store.price_change_reference_rate, refreshed by the periodic scrape
+maintenance, see refresh_reference_rates),
+which keeps the store's total fetches per day what its fixed interval would
+make them. The result is clamped to the
+store's min_scraping_interval_hours and max_scraping_interval_hours. An
+unset bound is the store's own interval, so with neither set every product
+keeps the store's fixed interval.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db.models import Avg, F
+from django.db.models.functions import Sqrt
+from marketplace.models import Store
+from .models import Product
+
+
+def decay(gap_hours):
+    """Weight left on earlier observations after gap_hours."""
+    return 0.5 ** (gap_hours / (settings.SCRAPE_VOLATILITY_HALF_LIFE_DAYS * 24))
+
+
+def observe(changes, hours, gap_hours, changed):
+    """Decayed (changes, hours) totals after one more observation."""
+    weight = decay(gap_hours)
+    return changes * weight + (1 if changed else 0), hours * weight + gap_hours
+
+
+def change_rate(changes, hours, interval_hours):
+    """Estimated price changes per hour."""
+    return (changes + 1) / (hours + interval_hours)
+
+
+def scrape_interval_hours(changes, hours, interval_hours, min_hours=None, max_hours=None, reference_rate=None):
+    """Hours until a product with these totals should next be scraped."""
+    if min_hours is None and max_hours is None:
+        return interval_hours
+    reference = reference_rate or 1 / interval_hours
+    adapted = interval_hours * math.sqrt(reference / change_rate(changes, hours, interval_hours))
+    return min(max(adapted, min_hours or interval_hours), max_hours or interval_hours)
+
+
+def reference_rate(store_id):
+    """The store's reference change rate from its products' current estimates, or None."""
+    interval_hours = Store.objects.values_list('scraping_interval_hours', flat=True).get(pk=store_id)
+    mean = Product.objects.filter(
+        store_id=store_id, is_active=True, last_scraped__isnull=False,
+    ).aggregate(mean=Avg(Sqrt(
+        (F('price_changes_observed') + 1) / (F('price_hours_observed') + interval_hours)
+    )))['mean']
+    return mean ** 2 if mean else None
+
+
+def refresh_reference_rates(stores=None):
+    """
+    Store the reference rate of each store (of the given Store queryset, or
+    each active one with scraping enabled) as its price_change_reference_rate.
+
+    It moves slowly, as the decayed totals of many products do, so it is
+    refreshed on a schedule rather than whenever a scrape completes.
+    """
+    if stores is None:
+        stores = Store.objects.filter(is_active=True, scraping_enabled=True)
+    for store_id in stores.values_list('pk', flat=True):
+        Store.objects.filter(pk=store_id).update(price_change_reference_rate=reference_rate(store_id))
+
+
+def next_scrape_time(product, now):
+    """
+    When a product fetched at now is next due. product is a dict of
+    SCRAPE_PRODUCT_FIELDS with the updated price_changes_observed and
+    price_hours_observed.
+    """
+    return now + datetime.timedelta(hours=scrape_interval_hours(
+        product['price_changes_observed'],
+        product['price_hours_observed'],
+        product['store__scraping_interval_hours'],
+        product['store__min_scraping_interval_hours'],
+        product['store__max_scraping_interval_hours'],
+        product['store__price_change_reference_rate'],
+    ))
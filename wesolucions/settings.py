@@ -240,3 +240,122 @@ for frontend_url in [VERCEL_FRONTEND_URL, NETLIFY_FRONTEND_URL]:
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Number of CSV rows written per bulk upsert during product uploads
+UPLOAD_BATCH_SIZE = int(os.getenv('UPLOAD_BATCH_SIZE', '2000'))
+
+# Upper bound on worker processes for parallel (partitioned) uploads through
+# the API. 1 keeps uploads serial; raise it only where
+# `manage.py bench_upload --workers 1 2 4` shows throughput scaling with
+# workers on the deployment's cores and database.
+UPLOAD_MAX_WORKERS = int(os.getenv('UPLOAD_MAX_WORKERS', '1'))
+
+# Rows per DataFrame chunk in the pre-validation pass
+UPLOAD_VALIDATION_CHUNK_ROWS = 100000
+
+# Uploaded files are kept under MEDIA_ROOT/<UPLOAD_FILES_DIR> until processed,
+# so interrupted uploads can be resumed
+UPLOAD_FILES_DIR = 'uploads'
+
+# Row errors kept inline in Upload.error_details; the rest are paged from UploadError
+UPLOAD_ERROR_SAMPLE_SIZE = 20
+
+# Scraping engine: concurrent fetches in total and per vendor host, and the
+# default connection pool size per vendor (Vendor.scrape_connection_limit)
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', '64'))
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv('SCRAPE_PER_HOST_CONCURRENCY', '16'))
+SCRAPE_VENDOR_CONNECTIONS = int(os.getenv('SCRAPE_VENDOR_CONNECTIONS', '32'))
+SCRAPE_TIMEOUT_SECONDS = int(os.getenv('SCRAPE_TIMEOUT_SECONDS', '30'))
+SCRAPE_USER_AGENT = os.getenv('SCRAPE_USER_AGENT', 'Mozilla/5.0 (compatible; WEsolucions/1.0)')
+
+# Processes each scrape engine parses fetched pages on, off its event loop;
+# 0 parses on the event loop itself
+SCRAPE_PARSE_WORKERS = int(os.getenv('SCRAPE_PARSE_WORKERS', '2'))
+
+# Products loaded from the database per page while a scrape runs
+SCRAPE_PAGE_SIZE = 1000
+
+# Pooled scrape connections: DNS answers are cached and idle keep-alive
+# connections held open for these many seconds
+SCRAPE_DNS_CACHE_SECONDS = 300
+SCRAPE_KEEPALIVE_SECONDS = 30
+
+# Scrape results are written in one transaction per this many products, or
+# at least every SCRAPE_FLUSH_SECONDS while a scrape runs
+SCRAPE_FLUSH_SIZE = int(os.getenv('SCRAPE_FLUSH_SIZE', '500'))
+SCRAPE_FLUSH_SECONDS = 2
+
+# A scrape progress event stream is closed after this many seconds (the
+# browser's EventSource reconnects), so it does not hold a server thread for
+# the whole of a long scrape
+SCRAPE_PROGRESS_STREAM_SECONDS = int(os.getenv('SCRAPE_PROGRESS_STREAM_SECONDS', '300'))
+
+# A product whose scrape failed is retried after this many minutes rather
+# than waiting out its store's scraping interval
+SCRAPE_RETRY_FAILED_MINUTES = int(os.getenv('SCRAPE_RETRY_FAILED_MINUTES', '60'))
+
+# Write a ScrapeResult only when a product's price, stock or title changed
+# (or its scrape failed); unchanged products just get last_scraped bumped
+# and are counted in Scrape.unchanged_scrapes
+SCRAPE_SKIP_UNCHANGED_RESULTS = os.getenv('SCRAPE_SKIP_UNCHANGED_RESULTS', 'False') == 'True'
+
+# ScrapeResults are kept in daily partitions, created this many days ahead,
+# for SCRAPE_RESULT_RETENTION_DAYS; older days are rolled up into
+# DailyScrapeSummary rows and dropped by the periodic scrape maintenance
+# (or `manage.py purge_scrape_results`)
+SCRAPE_RESULT_RETENTION_DAYS = int(os.getenv('SCRAPE_RESULT_RETENTION_DAYS', '90'))
+SCRAPE_RESULT_PARTITION_DAYS_AHEAD = 7
+
+# Within a scrape, a fetch that times out, cannot connect or gets HTTP 429 or
+# 5xx is tried up to SCRAPE_RETRY_ATTEMPTS times, with jittered backoff from
+# SCRAPE_RETRY_BASE_SECONDS doubling up to SCRAPE_RETRY_MAX_SECONDS
+SCRAPE_RETRY_ATTEMPTS = int(os.getenv('SCRAPE_RETRY_ATTEMPTS', '3'))
+SCRAPE_RETRY_BASE_SECONDS = 1
+SCRAPE_RETRY_MAX_SECONDS = 30
+
+# Per-host circuit breaker: once SCRAPE_BREAKER_FAILURE_RATE of a host's last
+# SCRAPE_BREAKER_WINDOW fetches (and at least SCRAPE_BREAKER_MIN_REQUESTS)
+# failed, its products fail without a request for SCRAPE_BREAKER_OPEN_SECONDS,
+# after which a single probe decides whether to resume
+SCRAPE_BREAKER_WINDOW = 20
+SCRAPE_BREAKER_MIN_REQUESTS = 10
+SCRAPE_BREAKER_FAILURE_RATE = float(os.getenv('SCRAPE_BREAKER_FAILURE_RATE', '0.5'))
+SCRAPE_BREAKER_OPEN_SECONDS = int(os.getenv('SCRAPE_BREAKER_OPEN_SECONDS', '60'))
+
+# Scrape scheduler: due products claimed per query, how long a claim holds a
+# product before it is due again, and the longest sleep while nothing is due
+SCRAPE_SCHEDULER_CLAIM_SIZE = 1000
+SCRAPE_CLAIM_MINUTES = int(os.getenv('SCRAPE_CLAIM_MINUTES', '30'))
+SCRAPE_SCHEDULER_IDLE_SECONDS = 30
+
+# Observed price changes lose half their weight in a product's change rate
+# estimate after this many days
+SCRAPE_VOLATILITY_HALF_LIFE_DAYS = 30
+
+# Distributed scraping: POST /products/scrape queues scrapes in leases of
+# SCRAPE_LEASE_SIZE products, for run_scrape_worker processes with
+# SCRAPE_USE_WORKERS, otherwise for a worker thread of the web process. A
+# lease not renewed for SCRAPE_LEASE_SECONDS is taken over by another worker;
+# one claimed SCRAPE_LEASE_MAX_ATTEMPTS times without finishing fails its
+# Scrape.
+SCRAPE_USE_WORKERS = os.getenv('SCRAPE_USE_WORKERS', 'False') == 'True'
+SCRAPE_LEASE_SIZE = int(os.getenv('SCRAPE_LEASE_SIZE', '2000'))
+SCRAPE_LEASE_SECONDS = 120
+SCRAPE_LEASE_MAX_ATTEMPTS = int(os.getenv('SCRAPE_LEASE_MAX_ATTEMPTS', '3'))
+SCRAPE_WORKER_IDLE_SECONDS = 5
+
+# Scrape workers and the scheduler run the periodic maintenance (partitions,
+# retention, store schedules, reference rates, archive; see
+# products.maintenance) this often
+SCRAPE_MAINTENANCE_MINUTES = int(os.getenv('SCRAPE_MAINTENANCE_MINUTES', '60'))
+
+# Scrape page archive: fetched page bodies are kept gzip-compressed under
+# MEDIA_ROOT/<SCRAPE_ARCHIVE_DIR>, once per distinct content, so runs can be
+# re-parsed without refetching. Pages not fetched again for
+# SCRAPE_ARCHIVE_MAX_AGE_DAYS are purged, then the least recently fetched
+# ones until the archive fits in SCRAPE_ARCHIVE_MAX_MB, by the periodic
+# scrape maintenance (or `manage.py purge_scrape_archive`).
+SCRAPE_ARCHIVE_ENABLED = os.getenv('SCRAPE_ARCHIVE_ENABLED', 'False') == 'True'
+SCRAPE_ARCHIVE_DIR = 'scrape_archive'
+SCRAPE_ARCHIVE_MAX_AGE_DAYS = int(os.getenv('SCRAPE_ARCHIVE_MAX_AGE_DAYS', '30'))
+SCRAPE_ARCHIVE_MAX_MB = int(os.getenv('SCRAPE_ARCHIVE_MAX_MB', '10240'))